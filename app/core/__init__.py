@@ -0,0 +1 @@
+# Silnik obliczeniowy aplikacji - funkcje niezależne od stron Streamlit
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.core.profiling import profiled
+
+
+# Funkcja do zakodowania kolumny liczbami całkowitymi (kategorie są kodowane bez kopiowania tekstu)
+def encode_column(values: pd.Series):
+    codes, uniques = pd.factorize(values, sort=False)
+    return codes, uniques
+
+
+# Funkcja do budowy rzadkiej macierzy koszyków (wiersze: koszyki, kolumny: produkty/marki/kategorie)
+def build_basket_matrix(basket_ids, items):
+    basket_codes, baskets = encode_column(basket_ids)
+    item_codes, item_values = encode_column(items)
+
+    # Pomijamy braki danych (kod -1 z factorize)
+    valid = (basket_codes >= 0) & (item_codes >= 0)
+    basket_codes = basket_codes[valid]
+    item_codes = item_codes[valid]
+
+    # Powtórzenia pary (koszyk, produkt) są sumowane przy budowie macierzy (True + True = True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(basket_codes), dtype=bool), (basket_codes, item_codes)),
+        shape=(len(baskets), len(item_values)),
+    )
+
+    item_labels = pd.Index(item_values).astype(str)
+    return matrix, item_labels
+
+
+# Funkcja do zamiany macierzy CSR na rzadki DataFrame obsługiwany przez mlxtend
+def to_sparse_frame(matrix, item_labels) -> pd.DataFrame:
+    frame = pd.DataFrame.sparse.from_spmatrix(matrix.astype(np.uint8), columns=item_labels)
+    return frame.astype(pd.SparseDtype(bool, False))
+
+
+# Dostępne definicje koszyka i kolumny potrzebne do ich zbudowania
+BASKET_MODES = {
+    "user": ["user_id"],
+    "session": ["user_session"],
+    "window": ["user_id", "event_time"],
+}
+
+
+# Funkcja do wyznaczenia identyfikatora koszyka dla każdego zdarzenia
+def basket_keys(data: pd.DataFrame, mode: str = "user", window_days: int = 7):
+    if mode == "user":
+        return data['user_id']
+    if mode == "session":
+        # Sesje są kategorią - factorize korzysta z kodów zamiast porównywać teksty
+        return data['user_session']
+    if mode == "window":
+        # Koszyk = użytkownik w N-dniowym oknie liczonym od pierwszego dnia w danych
+        days = data['event_time'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        if len(days) == 0:
+            return days
+        windows = (days - days.min()) // window_days
+        user_codes, _ = pd.factorize(data['user_id'])
+        return user_codes.astype(np.int64) * (int(windows.max()) + 1) + windows
+    raise ValueError(f"Nieznana definicja koszyka: {mode}")
+
+
+# Funkcja do utworzenia koszyków (na użytkownika, sesję lub okno czasowe) bez przejścia przez tekst
+@profiled()
+def create_basket_matrix(data: pd.DataFrame, column: str, mode: str = "user", window_days: int = 7):
+    return build_basket_matrix(basket_keys(data, mode, window_days), data[column])
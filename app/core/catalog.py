@@ -0,0 +1,147 @@
+import json
+import os
+import re
+
+import pandas as pd
+
+from app.core.dataset_cache import CACHE_DIR, DICTIONARY_COLUMNS, write_parquet, write_parquet_chunks
+from app.core.ingest import downcast_ids, iter_events_csv
+
+# Katalog z miesięcznymi plikami CSV (np. data/raw/cosmetic/2019-Oct.csv, data/raw/multistore/2019-Nov.csv)
+DATA_DIR = os.environ.get("MARKETING_APP_DATA_DIR", os.path.join("data", "raw"))
+
+# Miesięczne pliki skonwertowane do Parquet, partycjonowane wg miesiąca: {kolekcja}/month=2019-10/part-0.parquet
+# Opisy i agregaty miesięcy trzymamy w {kolekcja}/_meta (katalogi z "_" są pomijane przy skanowaniu zbioru)
+CATALOG_DIR = os.path.join(CACHE_DIR, "catalog")
+
+MONTH_PATTERN = re.compile(r"(\d{4})-(\d{2}|[A-Za-z]{3})")
+MONTH_ABBREVIATIONS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+
+# Funkcja do odczytania miesiąca z nazwy pliku (2019-Oct.csv -> 2019-10), None dla innych plików
+def parse_month(file_name: str):
+    match = MONTH_PATTERN.search(file_name)
+    if match is None:
+        return None
+    year, month = match.groups()
+    month = int(month) if month.isdigit() else MONTH_ABBREVIATIONS.get(month.lower())
+    if month is None or not 1 <= month <= 12:
+        return None
+    return f"{year}-{month:02d}"
+
+
+def _partition_path(collection: str, month: str) -> str:
+    return os.path.join(CATALOG_DIR, collection, f"month={month}", "part-0.parquet")
+
+
+def _month_meta_path(collection: str, month: str) -> str:
+    return os.path.join(CATALOG_DIR, collection, "_meta", f"{month}.json")
+
+
+def _month_artifact_path(collection: str, month: str, name: str) -> str:
+    return os.path.join(CATALOG_DIR, collection, "_meta", f"{month}.{name}.parquet")
+
+
+# Funkcja opisująca plik źródłowy (zmiana rozmiaru lub daty modyfikacji wymusza ponowną konwersję)
+def source_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+# Funkcja do wyszukania miesięcznych plików CSV - kolekcją jest katalog, w którym leżą pliki
+def scan_directory(directory: str = DATA_DIR) -> dict:
+    collections = {}
+    if not os.path.isdir(directory):
+        return collections
+    for dir_path, _, file_names in os.walk(directory):
+        relative = os.path.relpath(dir_path, directory)
+        collection = os.path.basename(os.path.abspath(directory)) if relative == "." else relative
+        for file_name in sorted(file_names):
+            month = parse_month(file_name)
+            if month is None or not file_name.lower().endswith(".csv"):
+                continue
+            path = os.path.join(dir_path, file_name)
+            collections.setdefault(collection, []).append({
+                "collection": collection,
+                "month": month,
+                "path": path,
+                "size_mb": os.path.getsize(path) / (1024 * 1024),
+                "registered": is_registered(collection, month, path),
+            })
+    for months in collections.values():
+        months.sort(key=lambda entry: entry["month"])
+    return collections
+
+
+# Funkcja zwracająca opis skonwertowanego miesiąca (None, jeśli miesiąc nie był jeszcze konwertowany)
+def month_meta(collection: str, month: str):
+    path = _month_meta_path(collection, month)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+# Funkcja sprawdzająca, czy miesiąc jest skonwertowany z aktualnej wersji pliku CSV
+def is_registered(collection: str, month: str, csv_path: str) -> bool:
+    meta = month_meta(collection, month)
+    if meta is None or not os.path.exists(_partition_path(collection, month)):
+        return False
+    signature = source_signature(csv_path)
+    return all(meta.get(field) == value for field, value in signature.items())
+
+
+# Funkcja do strumieniowej konwersji miesięcznego pliku CSV do partycji Parquet (fragment po fragmencie)
+def register_month(collection: str, month: str, csv_path: str, progress_callback=None) -> dict:
+    path = _partition_path(collection, month)
+    try:
+        # Plik tymczasowy zaczyna się od "." - takie pliki są pomijane przy skanowaniu partycji
+        rows, columns = write_parquet_chunks(iter_events_csv(csv_path, progress_callback=progress_callback), path, ".")
+    except ValueError:
+        raise ValueError(f"Plik {csv_path} nie zawiera danych.")
+
+    meta = dict(source_signature(csv_path), collection=collection, month=month, rows=rows,
+                columns=columns, path=path)
+    os.makedirs(os.path.dirname(_month_meta_path(collection, month)), exist_ok=True)
+    with open(_month_meta_path(collection, month), "w", encoding="utf-8") as handle:
+        json.dump(meta, handle, ensure_ascii=False)
+    return meta
+
+
+# Funkcja do leniwego skanowania kolekcji jako jednego zbioru Arrow (partycje wg miesiąca)
+# Moduł pyarrow.dataset importujemy dopiero tutaj - jego import wyraźnie wydłuża start aplikacji
+def open_collection(collection: str):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.dataset(
+        os.path.join(CATALOG_DIR, collection),
+        format=ds.ParquetFileFormat(read_options={"dictionary_columns": DICTIONARY_COLUMNS}),
+        partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"),
+    )
+
+
+# Funkcja do odczytu wybranych miesięcy i kolumn - pozostałe partycje nie są w ogóle czytane
+def load_months(collection: str, months: list, columns: list = None) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    dataset = open_collection(collection)
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "month"]
+    table = dataset.to_table(columns=columns, filter=ds.field("month").isin(months))
+    return downcast_ids(table.to_pandas())
+
+
+# Funkcje do odczytu i zapisu agregatów pojedynczego miesiąca (łączone dla dowolnego zestawu miesięcy)
+def load_month_artifact(collection: str, month: str, name: str):
+    path = _month_artifact_path(collection, month, name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, engine="pyarrow")
+
+
+def store_month_artifact(collection: str, month: str, name: str, df: pd.DataFrame) -> None:
+    write_parquet(df, _month_artifact_path(collection, month, name))
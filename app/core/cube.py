@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from app.core.sketches import HLL_PRECISION, grouped_hll_registers, merge_hll
+
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTH_ORDER = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+
+# Funkcja do budowy kostki przychodów (dzień x godzina x typ zdarzenia) - raz na zbiór danych
+def build_revenue_cube(df: pd.DataFrame) -> pd.DataFrame:
+    event_times = df['event_time'].to_numpy()
+    day = event_times.astype('datetime64[D]')
+    hour = ((event_times - day) // np.timedelta64(1, 'h')).astype(np.int8)
+
+    cube = df.groupby([day, hour, df['event_type']], sort=True, observed=True, dropna=False).agg(
+        events=('price', 'size'),
+        priced_events=('price', 'count'),
+        revenue=('price', 'sum'),
+    )
+    cube.index.names = ['day', 'hour', 'event_type']
+    cube = cube.reset_index()
+    cube['day'] = cube['day'].astype('datetime64[ns]')
+    cube['revenue'] = cube['revenue'].astype(np.float64)
+    return cube
+
+
+# Funkcja do budowy dziennych szkiców HyperLogLog użytkowników (do łączenia dla dowolnego zakresu dat)
+def build_daily_users_hll(df: pd.DataFrame) -> pd.DataFrame:
+    day_codes, days = pd.factorize(df['event_time'].to_numpy().astype('datetime64[D]'), sort=True)
+    registers = grouped_hll_registers(day_codes, len(days), df['user_id'].to_numpy())
+    return pd.DataFrame({
+        'day': pd.DatetimeIndex(days).astype('datetime64[ns]'),
+        'registers': [row.tobytes() for row in registers],
+    })
+
+
+# Funkcja do połączenia dziennych szkiców z wybranego zakresu w jeden szkic
+def merge_daily_users(daily_users: pd.DataFrame):
+    registers = np.array([np.frombuffer(row, dtype=np.uint8) for row in daily_users['registers']])
+    return merge_hll(registers.reshape(len(daily_users), 1 << HLL_PRECISION))
+
+
+# Funkcja do obliczenia metryk nagłówkowych dashboardu z wycinka kostki
+def cube_metrics(cube: pd.DataFrame, daily_users: pd.DataFrame) -> dict:
+    total_transactions = int(cube['events'].sum())
+    total_revenue = float(cube['revenue'].sum())
+    priced_events = int(cube['priced_events'].sum())
+    users_sketch = merge_daily_users(daily_users)
+    return {
+        'total_transactions': total_transactions,
+        'total_revenue': total_revenue,
+        'average_transaction_value': total_revenue / priced_events if priced_events else float('nan'),
+        'unique_users': int(round(users_sketch.count())),
+        'unique_users_error': users_sketch.relative_error,
+    }
+
+
+# Funkcje do wykresów zakupów wg godzin, dni tygodnia i miesięcy (sumy z kostki)
+def hourly_revenue(purchase_cube: pd.DataFrame) -> pd.DataFrame:
+    return purchase_cube.groupby('hour')['revenue'].sum().rename('price').reset_index()
+
+
+def weekday_revenue(purchase_cube: pd.DataFrame) -> pd.DataFrame:
+    weekday = purchase_cube['day'].dt.dayofweek
+    revenue = purchase_cube['revenue'].groupby(weekday).sum().reindex(range(7), fill_value=0.0)
+    return pd.DataFrame({
+        'day_of_week': pd.Categorical(DAY_ORDER, categories=DAY_ORDER, ordered=True),
+        'price': revenue.to_numpy(),
+    })
+
+
+def monthly_revenue(purchase_cube: pd.DataFrame) -> pd.DataFrame:
+    month = purchase_cube['day'].dt.month
+    revenue = purchase_cube['revenue'].groupby(month).sum().reindex(range(1, 13), fill_value=0.0)
+    return pd.DataFrame({
+        'month': pd.Categorical(MONTH_ORDER, categories=MONTH_ORDER, ordered=True),
+        'price': revenue.to_numpy(),
+    })
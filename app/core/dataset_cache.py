@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from app.core.ingest import EVENT_DTYPES, downcast_ids
+
+# Katalog z kolumnowymi kopiami wgranych plików (współdzielony przez wszystkie sesje)
+CACHE_DIR = os.environ.get("MARKETING_APP_CACHE_DIR", os.path.join("data", "cache"))
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Kolumny odczytywane z Parquet jako słowniki (w pandas - jako kategorie, jak przy wczytywaniu CSV)
+DICTIONARY_COLUMNS = [col for col, dtype in EVENT_DTYPES.items() if dtype == "category"]
+
+
+# Funkcja do obliczenia skrótu zawartości pliku (klucz w cache)
+def content_hash(source) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    else:
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()
+
+
+def _parquet_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def _meta_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _artifact_path(key: str, name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.{name}.parquet")
+
+
+# Funkcja zwracająca unikalną nazwę pliku tymczasowego obok pliku docelowego - sesje Streamlit są wątkami
+# jednego procesu, więc stała nazwa (lub pid) nie rozdziela równoległych zapisów tego samego pliku
+def temp_path(path: str, prefix: str = "") -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f"{prefix}{name}.{uuid.uuid4().hex}.tmp")
+
+
+# Funkcja usuwająca pozostałość po nieudanym zapisie
+def _discard(tmp_path: str) -> None:
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+# Funkcja do zapisu DataFrame w pliku tymczasowym i podmiany (inne sesje nie zobaczą niepełnego pliku)
+def write_parquet(df: pd.DataFrame, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = temp_path(path)
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+# Funkcja do ujednolicenia schematu fragmentów (kategorie z różnych fragmentów mają różne typy indeksów)
+def dictionary_schema(schema):
+    import pyarrow as pa
+
+    fields = [
+        pa.field(field.name, pa.dictionary(pa.int32(), pa.string())) if field.name in DICTIONARY_COLUMNS else field
+        for field in schema
+    ]
+    return pa.schema(fields)
+
+
+# Funkcja kodująca słownikowo kolumny tekstowe, które w zbiorze są kategoriami (np. user_session
+# czytane z CSV jako tekst) - w Parquet wszystkie fragmenty mają wtedy ten sam typ
+def encode_dictionaries(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for i, field in enumerate(table.schema):
+        if field.name in DICTIONARY_COLUMNS and not pa.types.is_dictionary(field.type):
+            column = table.column(i)
+            if pa.types.is_null(column.type):
+                column = column.cast(pa.string())
+            table = table.set_column(i, field.name, pc.dictionary_encode(column))
+    return table
+
+
+# Funkcja do strumieniowego zapisu kolejnych fragmentów DataFrame do jednego pliku Parquet
+# W pamięci jest tylko bieżący fragment - zwraca liczbę wierszy i nazwy kolumn
+# (tmp_prefix pozwala ukryć plik tymczasowy, np. "." - pomijany przy skanowaniu katalogu partycji)
+def write_parquet_chunks(chunks, path: str, tmp_prefix: str = "") -> tuple:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = temp_path(path, tmp_prefix)
+    writer = None
+    rows = 0
+    try:
+        try:
+            for chunk in chunks:
+                table = encode_dictionaries(pa.Table.from_pandas(chunk, preserve_index=False))
+                if writer is None:
+                    schema = dictionary_schema(table.schema)
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(table.cast(schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError("Plik nie zawiera danych.")
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return rows, schema.names
+
+
+def _read_meta(key: str) -> dict:
+    with open(_meta_path(key), encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_meta(key: str, meta: dict) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = temp_path(_meta_path(key))
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(meta, handle, ensure_ascii=False)
+        os.replace(tmp_path, _meta_path(key))
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+# Funkcja sprawdzająca, czy dany zbiór jest już w cache (własna kopia Parquet lub widok na pliki źródłowe)
+def is_cached(key: str) -> bool:
+    if not os.path.exists(_meta_path(key)):
+        return False
+    if os.path.exists(_parquet_path(key)):
+        return True
+    sources = _read_meta(key).get("sources")
+    return bool(sources) and all(os.path.exists(path) for path in sources)
+
+
+# Funkcja zwracająca opis zbioru z cache (None, jeśli zbioru nie ma na dysku)
+def dataset_meta(key: str):
+    return _read_meta(key) if is_cached(key) else None
+
+
+# Funkcja zwracająca pliki Parquet, z których składa się zbiór (własna kopia lub pliki źródłowe widoku)
+def dataset_sources(key: str) -> list:
+    if os.path.exists(_parquet_path(key)):
+        return [_parquet_path(key)]
+    return list(_read_meta(key)["sources"])
+
+
+# Funkcja do odczytu kopii Parquet (mapowanej w pamięci zamiast parsowania CSV)
+def load_cached(key: str) -> pd.DataFrame:
+    if os.path.exists(_parquet_path(key)):
+        return pd.read_parquet(_parquet_path(key), engine="pyarrow", memory_map=True)
+    # Widok na kilka plików Parquet (np. wybrane miesiące z katalogu) - czytamy je jako jeden zbiór
+    return load_parquet_sources(_read_meta(key)["sources"])
+
+
+# Funkcja do odczytu kilku plików Parquet jako jednego DataFrame (kolumny tekstowe jako kategorie)
+def load_parquet_sources(sources: list, columns: list = None, row_filter=None) -> pd.DataFrame:
+    import pyarrow.dataset as ds  # Moduł zbiorów Arrow importujemy dopiero przy odczycie (wolny import)
+
+    dataset = ds.dataset(sources, format=ds.ParquetFileFormat(read_options={"dictionary_columns": DICTIONARY_COLUMNS}))
+    return downcast_ids(dataset.to_table(columns=columns, filter=row_filter).to_pandas())
+
+
+# Funkcja do zapisu kopii Parquet wraz z opisem zbioru
+def store_cached(key: str, df: pd.DataFrame, name: str) -> None:
+    write_parquet(df, _parquet_path(key))
+
+    meta = {
+        "key": key,
+        "name": name,
+        "rows": int(len(df)),
+        "columns": list(df.columns),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    _write_meta(key, meta)
+
+
+# Funkcja do zapisu zbioru prosto z fragmentów CSV (bez wczytywania całości) - zbiór oznaczony jako
+# przetwarzany poza pamięcią nigdy nie jest wczytywany do rejestru, nawet jeśli mieści się w progu
+def store_cached_chunks(key: str, chunks, name: str, out_of_core: bool = False) -> dict:
+    rows, columns = write_parquet_chunks(chunks, _parquet_path(key))
+    meta = {
+        "key": key,
+        "name": name,
+        "rows": int(rows),
+        "columns": list(columns),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "out_of_core": out_of_core,
+    }
+    _write_meta(key, meta)
+    return meta
+
+
+# Funkcja do oznaczenia zbioru z cache jako przetwarzanego poza pamięcią (DuckDB)
+def mark_out_of_core(key: str) -> None:
+    _write_meta(key, dict(_read_meta(key), out_of_core=True))
+
+
+# Funkcja do zapisu opisu zbioru złożonego z istniejących plików Parquet (bez kopiowania danych)
+def store_view(key: str, name: str, sources: list, rows: int, columns: list) -> None:
+    meta = {
+        "key": key,
+        "name": name,
+        "rows": int(rows),
+        "columns": list(columns),
+        "sources": list(sources),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    _write_meta(key, meta)
+
+
+# Funkcja zwracająca listę wcześniej wczytanych zbiorów (od najnowszego)
+def list_cached() -> list:
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    datasets = []
+    for file_name in os.listdir(CACHE_DIR):
+        if not file_name.endswith(".json"):
+            continue
+        key = file_name[:-len(".json")]
+        if not is_cached(key):
+            continue
+        datasets.append(_read_meta(key))
+    return sorted(datasets, key=lambda meta: meta["created"], reverse=True)
+
+
+# Funkcja sprawdzająca, czy tabela pochodna zbioru jest już zapisana na dysku
+def has_artifact(key: str, name: str) -> bool:
+    return os.path.exists(_artifact_path(key, name))
+
+
+# Funkcja do odczytu tabeli pochodnej zbioru (np. agregatów budowanych przy wczytywaniu)
+def load_artifact(key: str, name: str):
+    path = _artifact_path(key, name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, engine="pyarrow", memory_map=True)
+
+
+# Funkcja do zapisu tabeli pochodnej zbioru obok jego kopii Parquet
+def store_artifact(key: str, name: str, df: pd.DataFrame) -> None:
+    write_parquet(df, _artifact_path(key, name))
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from app.core import catalog
+from app.core.dataset_cache import (
+    content_hash, dataset_meta, dataset_sources, is_cached, load_artifact, load_cached, mark_out_of_core,
+    store_artifact, store_cached, store_cached_chunks, store_view
+)
+from app.core.ingest import iter_events_csv, read_events_csv
+from app.core.profiling import profile_stage
+from app.core.query_backend import ARTIFACT_BUILDERS, DuckDBBackend, PandasBackend
+from app.core.result_cache import get_result_cache
+from app.core.time_index import sort_by_event_time
+
+# Budżet pamięci dla wszystkich zbiorów trzymanych w procesie serwera
+MEMORY_BUDGET_MB = float(os.environ.get("MARKETING_APP_MEMORY_BUDGET_MB", 8192))
+
+# Zbiory, które po wczytaniu zajęłyby więcej niż ten próg, są przetwarzane poza pamięcią (DuckDB na Parquet)
+OUT_OF_CORE_THRESHOLD_MB = float(os.environ.get("MARKETING_APP_OUT_OF_CORE_MB", MEMORY_BUDGET_MB / 2))
+
+# Przybliżony rozmiar wiersza w pamięci po wczytaniu z kompaktowymi typami (kategorie, int32, float32)
+COMPACT_BYTES_PER_ROW = 48
+
+ARTIFACT_CACHE_SIZE = 32
+BACKEND_CACHE_SIZE = 8
+
+# Kolumny potrzebne do budowy tabel pochodnych (tylko te są czytane z partycji miesięcznych)
+ARTIFACT_COLUMNS = ['event_time', 'event_type', 'price', 'user_id']
+
+
+# Funkcja zwracająca identyfikator bieżącej sesji Streamlit (None poza aplikacją)
+def _current_session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+# Funkcja sprawdzająca, czy sesja o danym identyfikatorze jest nadal aktywna
+def _is_active_session(session_id) -> bool:
+    try:
+        from streamlit.runtime import Runtime
+        return Runtime.instance().is_active_session(session_id)
+    except Exception:
+        return True
+
+
+class DatasetRegistry:
+    # Wspólny dla procesu rejestr zbiorów: jedna kopia DataFrame na klucz (skrót zawartości),
+    # sesje trzymają tylko klucz, a nieużywane zbiory są usuwane wg LRU po przekroczeniu budżetu
+
+    def __init__(self, memory_budget_mb: float = MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self._datasets = OrderedDict()
+        self._sizes = {}
+        self._holders = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        return key in self._datasets
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def put(self, key: str, df: pd.DataFrame, session_id=None) -> pd.DataFrame:
+        with self._lock:
+            if key not in self._datasets:
+                self._datasets[key] = sort_by_event_time(df)
+                self._sizes[key] = int(df.memory_usage(deep=True).sum())
+            self._touch(key, session_id)
+            self._evict()
+            return self._datasets.get(key, df)
+
+    def get(self, key: str, session_id=None):
+        while True:
+            with self._lock:
+                if key in self._datasets:
+                    self._touch(key, session_id)
+                    return self._datasets[key]
+                loading = self._loading.get(key)
+                owner = loading is None
+                if owner:
+                    loading = self._loading[key] = threading.Event()
+            if owner:
+                break
+            # Inna sesja właśnie odtwarza ten zbiór - czekamy na jej kopię zamiast wczytywać własną
+            loading.wait()
+
+        # Zbiór usunięty z pamięci - odtwarzamy go z kopii Parquet na dysku (tylko jedna sesja naraz)
+        try:
+            if is_cached(key):
+                return self.put(key, load_cached(key), session_id)
+            return None
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def release(self, key: str, session_id=None) -> None:
+        with self._lock:
+            self._holders.get(key, set()).discard(session_id)
+
+    def refcount(self, key: str) -> int:
+        with self._lock:
+            return self._refcount(key)
+
+    def stats(self) -> list:
+        with self._lock:
+            return [
+                {"key": key, "size_mb": self._sizes[key] / (1024 * 1024), "sessions": self._refcount(key)}
+                for key in self._datasets
+            ]
+
+    def _refcount(self, key) -> int:
+        return len(self._holders.get(key, ()))
+
+    def _touch(self, key, session_id) -> None:
+        self._datasets.move_to_end(key)
+        self._holders.setdefault(key, set()).add(session_id)
+
+    def _evict(self) -> None:
+        # Usuwamy informacje o sesjach, które zostały już zamknięte
+        for holders in self._holders.values():
+            holders.difference_update({sid for sid in holders if sid is not None and not _is_active_session(sid)})
+
+        # Najpierw nieużywane zbiory (od najdawniej używanego), potem pozostałe - z wyjątkiem najnowszego
+        candidates = [key for key in self._datasets if self._refcount(key) == 0]
+        candidates += [key for key in self._datasets if self._refcount(key) > 0]
+        newest = next(reversed(self._datasets))
+        for key in candidates:
+            if self.used_bytes <= self.memory_budget_bytes:
+                break
+            if key == newest:
+                continue
+            del self._datasets[key]
+            del self._sizes[key]
+            self._holders.pop(key, None)
+
+
+# Funkcja zwracająca jeden rejestr dla całego procesu serwera
+@st.cache_resource
+def get_registry() -> DatasetRegistry:
+    return DatasetRegistry()
+
+
+# Funkcja do zarejestrowania zbioru dla bieżącej sesji
+def set_session_dataset(key: str, df: pd.DataFrame = None) -> pd.DataFrame:
+    previous_key = st.session_state.get('dataset_key')
+    if previous_key is not None and previous_key != key:
+        get_registry().release(previous_key, _current_session_id())
+    st.session_state['dataset_key'] = key
+    if df is None:
+        # Zbiór z cache jest wczytywany dopiero przy pierwszym użyciu - zbiory przetwarzane
+        # poza pamięcią (DuckDB) w ogóle nie trafiają do rejestru
+        return None
+    return get_registry().put(key, df, _current_session_id())
+
+
+# Funkcja do otwarcia wgranego pliku: z pamięci serwera, z kopii Parquet lub z CSV
+def open_uploaded_dataset(source, name: str, progress_callback=None):
+    key = content_hash(source)
+    df = get_registry().get(key, _current_session_id())
+    from_cache = df is not None
+    if df is None:
+        df = read_events_csv(source, progress_callback=progress_callback)
+        store_cached(key, df, name)
+        for artifact_name in ARTIFACT_BUILDERS:
+            get_dataset_artifact(key, artifact_name, df)
+    return set_session_dataset(key, df), from_cache
+
+
+# Funkcja do otwarcia warstwowej próbki klientów z wgranego pliku (wszystkie zdarzenia części klientów
+# z każdej warstwy aktywności i wartości zakupów)
+# Próbka ma własny klucz - ten sam plik można też otworzyć w całości lub z innym udziałem klientów
+def open_uploaded_sample(source, name: str, fraction: float, progress_callback=None):
+    signature = [content_hash(source), "stratified", fraction]
+    key = hashlib.blake2b(json.dumps(signature).encode("utf-8"), digest_size=16).hexdigest()
+    df = get_registry().get(key, _current_session_id())
+    from_cache = df is not None
+    if df is None:
+        df = read_events_csv(source, progress_callback=progress_callback, user_fraction=fraction)
+        store_cached(key, df, f"{name} (próbka warstwowa {fraction:.0%} klientów)")
+        for artifact_name in ARTIFACT_BUILDERS:
+            get_dataset_artifact(key, artifact_name, df)
+    return set_session_dataset(key, df), from_cache
+
+
+# Funkcja do otwarcia wgranego pliku bez wczytywania go do pamięci: fragmenty CSV trafiają prosto do Parquet,
+# a analizy i tabele pochodne liczy DuckDB
+def open_uploaded_out_of_core(source, name: str, progress_callback=None) -> str:
+    key = content_hash(source)
+    if is_cached(key):
+        mark_out_of_core(key)
+    else:
+        with profile_stage('store_out_of_core') as stage:
+            stage['rows_out'] = store_cached_chunks(key, iter_events_csv(source, progress_callback=progress_callback),
+                                                    name, out_of_core=True)['rows']
+    for artifact_name in ARTIFACT_BUILDERS:
+        get_dataset_artifact(key, artifact_name)
+    set_session_dataset(key)
+    return key
+
+
+# Funkcja do przygotowania miesiąca z katalogu: konwersja CSV do Parquet i miesięczne tabele pochodne
+# Każdy krok wykonywany jest tylko raz - kolejne zestawy miesięcy korzystają z gotowych partycji
+def _prepare_catalog_month(entry: dict, progress_callback=None) -> dict:
+    collection, month = entry['collection'], entry['month']
+    if not catalog.is_registered(collection, month, entry['path']):
+        with profile_stage('register_month') as stage:
+            stage['rows_out'] = catalog.register_month(collection, month, entry['path'], progress_callback)['rows']
+
+    missing = [name for name in ARTIFACT_BUILDERS if catalog.load_month_artifact(collection, month, name) is None]
+    if missing:
+        month_df = catalog.load_months(collection, [month], ARTIFACT_COLUMNS)
+        for name in missing:
+            catalog.store_month_artifact(collection, month, name, ARTIFACT_BUILDERS[name](month_df))
+    return catalog.month_meta(collection, month)
+
+
+# Funkcja do otwarcia kilku miesięcy z katalogu jako jednego zbioru (widok na partycje Parquet)
+# Tabele pochodne zbioru składamy z miesięcznych - agregaty dzienne nie przekraczają granicy miesiąca
+def open_catalog_dataset(collection: str, months: list, progress_callback=None) -> str:
+    entries = [entry for entry in catalog.scan_directory()[collection] if entry['month'] in months]
+    metas = []
+    for i, entry in enumerate(entries):
+        step_callback = None
+        if progress_callback is not None:
+            step_callback = lambda done, total, i=i: progress_callback(i + done / total if total else i + 1, len(entries))
+        metas.append(_prepare_catalog_month(entry, step_callback))
+
+    signatures = [[meta['month'], meta['source'], meta['size'], meta['mtime']] for meta in metas]
+    key = hashlib.blake2b(json.dumps([collection, signatures]).encode("utf-8"), digest_size=16).hexdigest()
+    if not is_cached(key):
+        for name in ARTIFACT_BUILDERS:
+            parts = [catalog.load_month_artifact(collection, meta['month'], name) for meta in metas]
+            artifact = pd.concat(parts, ignore_index=True).sort_values('day', kind='stable', ignore_index=True)
+            store_artifact(key, name, artifact)
+        name = f"{collection} ({metas[0]['month']} - {metas[-1]['month']})"
+        store_view(key, name, [meta['path'] for meta in metas], sum(meta['rows'] for meta in metas), metas[0]['columns'])
+    set_session_dataset(key)
+    return key
+
+
+# Funkcja zwracająca tabelę pochodną zbioru: z pamięci, z dysku lub budowaną od nowa
+def get_dataset_artifact(key: str, name: str, df: pd.DataFrame = None) -> pd.DataFrame:
+    def load_or_build():
+        artifact = load_artifact(key, name)
+        if artifact is None:
+            backend = PandasBackend(df) if df is not None else get_dataset_backend(key)
+            artifact = backend.build_artifact(name)
+            store_artifact(key, name, artifact)
+        return artifact
+
+    return get_result_cache('artifacts', ARTIFACT_CACHE_SIZE).get_or_compute((key, name), load_or_build)
+
+
+# Funkcja do oszacowania rozmiaru zbioru w pamięci na podstawie liczby wierszy
+def estimated_memory_mb(rows: int) -> float:
+    return rows * COMPACT_BYTES_PER_ROW / (1024 * 1024)
+
+
+# Funkcja wybierająca sposób przetwarzania zbioru: w pamięci (pandas) lub poza pamięcią (DuckDB)
+# Zbiór, który już jest w pamięci serwera, zawsze przetwarzamy w pamięci; zbiór oznaczony przy wgrywaniu
+# jako przetwarzany poza pamięcią - zawsze przez DuckDB
+def get_dataset_backend(key: str):
+    meta = dataset_meta(key)
+    in_memory = key in get_registry()
+    out_of_core = meta is not None and (meta.get('out_of_core') or estimated_memory_mb(meta['rows']) > OUT_OF_CORE_THRESHOLD_MB)
+    if out_of_core and not in_memory:
+        backends = get_result_cache('backends', BACKEND_CACHE_SIZE)
+        return backends.get_or_compute(key, lambda: DuckDBBackend(dataset_sources(key)))
+    df = get_registry().get(key, _current_session_id())
+    return None if df is None else PandasBackend(df)
+
+
+# Funkcja zwracająca sposób przetwarzania zbioru bieżącej sesji (None, jeśli żaden nie został wgrany)
+def get_session_backend():
+    key = st.session_state.get('dataset_key')
+    if key is None:
+        return None
+    return get_dataset_backend(key)
+
+
+# Funkcja zwracająca zbiór bieżącej sesji (None, jeśli żaden nie został wgrany)
+def get_session_dataset():
+    key = st.session_state.get('dataset_key')
+    if key is None:
+        return None
+    return get_registry().get(key, _current_session_id())
+
+
+# Funkcja do odłączenia sesji od jej zbioru danych
+def clear_session_dataset() -> None:
+    key = st.session_state.pop('dataset_key', None)
+    if key is not None:
+        get_registry().release(key, _current_session_id())
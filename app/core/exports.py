@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import os
+import time
+
+import pandas as pd
+import streamlit as st
+
+from app.core.dataset_cache import CACHE_DIR, temp_path
+
+# Wygenerowane pliki do pobrania (nazwa = skrót zawartości i format, więc ten sam wynik zapisujemy raz)
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+MAX_EXPORT_FILES = 64
+
+# Pliki użyte w ostatnich sekundach nie są usuwane - inna sesja mogła właśnie dostać ścieżkę
+# z export_frame, a plik czyta dopiero przycisk pobierania
+EXPORT_GRACE_S = 600
+
+# Liczba wierszy zapisywanych naraz - plik powstaje fragmentami, bez pełnej kopii tekstu w pamięci
+EXPORT_CHUNK_ROWS = 200_000
+
+# Format -> (etykieta, typ MIME, rozszerzenie pliku)
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv", ".csv"),
+    "csv.gz": ("CSV (gzip)", "application/gzip", ".csv.gz"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", ".parquet"),
+}
+
+
+# Funkcja do obliczenia skrótu zawartości DataFrame (wartości i nazwy kolumn)
+def frame_hash(df: pd.DataFrame) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _write_csv(df: pd.DataFrame, handle) -> None:
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        df.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(handle, index=False, header=start == 0)
+
+
+def _write_parquet_chunks(df: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+# Funkcja usuwająca najstarsze pliki eksportu ponad limit (z pominięciem właśnie zwracanego
+# i używanych w ostatnich EXPORT_GRACE_S sekundach)
+def _prune_exports(keep: str = None) -> None:
+    mtimes = {}
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if name.endswith(".tmp") or path == keep:
+            continue
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            pass
+    cutoff = time.time() - EXPORT_GRACE_S
+    paths = sorted(mtimes, key=mtimes.get)
+    for path in paths[:max(len(paths) - MAX_EXPORT_FILES + 1, 0)]:
+        if mtimes[path] >= cutoff:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Funkcja do zapisu DataFrame do pliku w wybranym formacie - zwraca ścieżkę (istniejący plik jest używany ponownie)
+def export_frame(df: pd.DataFrame, fmt: str = "csv") -> str:
+    extension = EXPORT_FORMATS[fmt][2]
+    path = os.path.join(EXPORT_DIR, frame_hash(df) + extension)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tmp_path = temp_path(path)  # Unikalna nazwa - sesje są wątkami jednego procesu (wspólny pid)
+    try:
+        if fmt == "parquet":
+            _write_parquet_chunks(df, tmp_path)
+        elif fmt == "csv.gz":
+            with gzip.open(tmp_path, "wt", encoding="utf-8-sig", newline="") as handle:
+                _write_csv(df, handle)
+        else:
+            # Znacznik BOM (utf-8-sig) - polskie znaki poprawnie otwierają się w Excelu
+            with open(tmp_path, "w", encoding="utf-8-sig", newline="") as handle:
+                _write_csv(df, handle)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _prune_exports(keep=path)
+    return path
+
+
+# Przycisk pobierania z wyborem formatu - plik jest przygotowywany dopiero po kliknięciu
+# (frame może być DataFrame lub funkcją zwracającą DataFrame, np. gdy przygotowanie danych jest kosztowne)
+def export_button(label: str, frame, file_stem: str, key: str) -> None:
+    fmt = st.selectbox(
+        "Format pliku",
+        list(EXPORT_FORMATS),
+        format_func=lambda value: EXPORT_FORMATS[value][0],
+        key=f"{key}_format"
+    )
+    _, mime, extension = EXPORT_FORMATS[fmt]
+
+    def read_export():
+        df = frame() if callable(frame) else frame
+        with open(export_frame(df, fmt), "rb") as handle:
+            return handle.read()
+
+    st.download_button(
+        label=label,
+        data=read_export,
+        file_name=file_stem + extension,
+        mime=mime,
+        key=key
+    )
@@ -0,0 +1,63 @@
+import numpy as np
+
+# Domyślne parametry testu: punkty na próbę, liczba prób i maksymalny rozmiar zbioru odniesienia
+HOPKINS_SAMPLE_SIZE = 500
+HOPKINS_TRIALS = 10
+HOPKINS_REFERENCE_SIZE = 200_000
+
+# Progi interpretacji statystyki Hopkinsa (jak w models/test_hopkinsa.ipynb)
+HOPKINS_CLUSTERED = 0.75
+HOPKINS_WEAK = 0.5
+
+
+# Funkcja do skalowania cech do zakresu [0, 1] (jak MinMaxScaler, bez importu sklearn przy wstępnej ocenie)
+def scale_to_unit_range(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float64)
+    low, high = X.min(axis=0), X.max(axis=0)
+    scale = np.where(high > low, high - low, 1.0)
+    return (X - low) / scale
+
+
+# Funkcja do budowy drzewa KD na (opcjonalnie podpróbkowanym) zbiorze odniesienia
+# Drzewo budujemy raz i używamy we wszystkich próbach
+def build_reference_tree(X: np.ndarray, reference_size: int = HOPKINS_REFERENCE_SIZE, seed: int = 0):
+    from scipy.spatial import cKDTree
+
+    X = np.asarray(X, dtype=np.float64)
+    if reference_size is not None and len(X) > reference_size:
+        X = X[np.random.default_rng(seed).choice(len(X), reference_size, replace=False)]
+    return cKDTree(X), X
+
+
+# Statystyka Hopkinsa: H = U / (U + W), gdzie W to suma odległości punktów danych do najbliższego
+# sąsiada, a U - punktów losowych z tego samego zakresu (ok. 0.5 - dane losowe, blisko 1 - skupiska)
+# Notatnik models/test_hopkinsa.ipynb liczył W / (W + U), co odwracało znaczenie progów poniżej
+# Wszystkie próby liczone jednym zapytaniem do drzewa (workers=-1 rozkłada je na wszystkie rdzenie)
+# Zwraca średnią i odchylenie standardowe z prób
+def hopkins_statistic(X: np.ndarray, sample_size: int = HOPKINS_SAMPLE_SIZE, n_trials: int = HOPKINS_TRIALS,
+                      reference_size: int = HOPKINS_REFERENCE_SIZE, seed: int = 0, workers: int = -1):
+    tree, reference = build_reference_tree(X, reference_size, seed)
+    n, d = reference.shape
+    sample_size = min(sample_size, n - 1)
+    rng = np.random.default_rng(seed + 1)
+
+    # Próby losujemy bez powtórzeń w obrębie próby, więc najbliższy punkt (k=1) to sam punkt - bierzemy k=2
+    sample_index = np.concatenate([rng.choice(n, sample_size, replace=False) for _ in range(n_trials)])
+    real_distances = tree.query(reference[sample_index], k=2, workers=workers)[0][:, 1]
+
+    random_points = rng.uniform(reference.min(axis=0), reference.max(axis=0), (n_trials * sample_size, d))
+    random_distances = tree.query(random_points, k=1, workers=workers)[0]
+
+    W = real_distances.reshape(n_trials, sample_size).sum(axis=1)
+    U = random_distances.reshape(n_trials, sample_size).sum(axis=1)
+    H = U / (U + W)
+    return float(H.mean()), float(H.std())
+
+
+# Funkcja do słownego opisu statystyki Hopkinsa
+def describe_hopkins(H: float) -> str:
+    if H > HOPKINS_CLUSTERED:
+        return "Dane są wysoce skupiskowe, nadają się do klastrowania."
+    if H > HOPKINS_WEAK:
+        return "Dane mogą mieć pewną strukturę skupiskową."
+    return "Dane są rozproszone, klastrowanie może być mniej efektywne."
@@ -0,0 +1,301 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from app.core.profiling import profiled
+from app.core.sketches import hash64
+from app.core.time_index import sort_by_event_time
+
+logger = logging.getLogger(__name__)
+
+# Schemat kolumn szablonu CSV (patrz create_template na stronie głównej)
+EVENT_DTYPES = {
+    "event_type": "category",
+    "product_id": "int64",
+    "category_id": "int64",
+    "category_code": "category",
+    "brand": "category",
+    "price": "float32",
+    "user_id": "int64",
+    "user_session": "category",
+}
+
+# Identyfikatory czytamy jako nullable Int64 - pusta wartość nie przerywa wczytywania pliku
+NULLABLE_ID_COLUMNS = ["product_id", "category_id", "user_id"]
+
+# Wiersze bez tych identyfikatorów są pomijane (nie da się ich przypisać do klienta ani produktu)
+REQUIRED_ID_COLUMNS = ["user_id", "product_id"]
+
+# Kolumny o bardzo wielu unikalnych wartościach: czytane jako tekst i zamieniane na kategorie raz, po złączeniu
+# fragmentów (osobne słowniki w każdym fragmencie kosztują więcej niż samo parsowanie)
+LATE_CATEGORY_COLUMNS = ["user_session"]
+
+# Typy kolumn przy parsowaniu CSV (EVENT_DTYPES to typy zbioru po wczytaniu)
+READ_DTYPES = {
+    col: "Int64" if col in NULLABLE_ID_COLUMNS else "object" if col in LATE_CATEGORY_COLUMNS else dtype
+    for col, dtype in EVENT_DTYPES.items()
+}
+
+# Format event_time w plikach źródłowych (np. "2019-10-01 00:00:05 UTC")
+EVENT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+# Parsujemy pierwsze 19 znaków bez stałego sufiksu " UTC" - format bez literału pozwala pandas użyć
+# szybkiej ścieżki ISO 8601 zamiast strptime wywoływanego dla każdej wartości
+EVENT_TIME_PARSE_FORMAT = "%Y-%m-%d %H:%M:%S"
+EVENT_TIME_PARSE_LENGTH = 19
+EVENT_TIME_SUFFIXES = ["", " UTC"]
+
+# Kolumny identyfikatorów, które zmniejszamy do int32, jeśli zakres wartości na to pozwala
+DOWNCAST_ID_COLUMNS = ["user_id", "product_id"]
+
+DEFAULT_CHUNKSIZE = 500_000
+
+# Progi warstw próbki klientów: kwantyle liczby zdarzeń i sumy wartości zdarzeń klienta
+# (najwyższe progi wydzielają nieliczne warstwy najaktywniejszych i najcenniejszych klientów)
+SAMPLE_STRATA_LEVELS = (0.25, 0.5, 0.75, 0.95, 0.99)
+
+# Kolumny czytane w przebiegu wyznaczającym aktywność klientów (przed losowaniem próbki)
+ACTIVITY_DTYPES = {"user_id": "Int64", "price": "float32"}
+
+# Część paska postępu przypadająca na przebieg wyznaczający aktywność klientów (czytane są tylko 2 kolumny)
+ACTIVITY_PASS_SHARE = 0.2
+
+
+# Funkcja do jednorazowej konwersji kolumny event_time na datetime64
+def parse_event_time(values: pd.Series) -> pd.Series:
+    try:
+        # Obcinamy tylko sufiks " UTC" - inne strefy czasowe idą wolniejszą ścieżką z przeliczeniem na UTC
+        suffixes = values.str.slice(EVENT_TIME_PARSE_LENGTH)
+        if (suffixes.isin(EVENT_TIME_SUFFIXES) | suffixes.isna()).all():
+            return pd.to_datetime(values.str.slice(0, EVENT_TIME_PARSE_LENGTH), format=EVENT_TIME_PARSE_FORMAT)
+    except (ValueError, TypeError, AttributeError):
+        pass
+    try:
+        return pd.to_datetime(values, format=EVENT_TIME_FORMAT)
+    except (ValueError, TypeError):
+        # Plik w innym formacie daty - wolniejsza ścieżka z automatycznym rozpoznawaniem
+        parsed = pd.to_datetime(values, utc=True)
+        return parsed.dt.tz_localize(None)
+
+
+# Funkcja do ustalenia całkowitego rozmiaru pliku w bajtach
+def _source_size(source) -> int:
+    size = getattr(source, "size", None)
+    if size is not None:
+        return int(size)
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+# Funkcja do łączenia fragmentów z zachowaniem typów kategorycznych
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    if len(chunks) == 1:
+        return chunks[0]
+
+    column_order = list(chunks[0].columns)
+    categorical_columns = [
+        col for col in chunks[0].columns
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)
+    ]
+    combined = {}
+    for col in categorical_columns:
+        # Zwykły pd.concat zamieniłby kategorie o różnych słownikach na object
+        combined[col] = union_categoricals([chunk[col] for chunk in chunks])
+        for chunk in chunks:
+            del chunk[col]
+
+    df = pd.concat(chunks, ignore_index=True)
+    for col in categorical_columns:
+        df[col] = combined[col]
+    return df[column_order]
+
+
+# Funkcja usuwająca wiersze bez identyfikatora klienta lub produktu i zamieniająca kompletne kolumny
+# identyfikatorów z nullable Int64 na zwykłe int64 (category_id z pustymi wartościami zostaje jako Int64)
+def complete_ids(chunk: pd.DataFrame) -> pd.DataFrame:
+    required = [col for col in REQUIRED_ID_COLUMNS if col in chunk.columns]
+    if required:
+        missing = chunk[required].isna().any(axis=1).to_numpy()
+        if missing.any():
+            logger.warning("Pominięto %d wierszy bez identyfikatora (%s)", int(missing.sum()), ", ".join(required))
+            chunk = chunk[~missing].reset_index(drop=True)
+    for col in NULLABLE_ID_COLUMNS:
+        if col in chunk.columns and not chunk[col].hasnans:
+            chunk[col] = chunk[col].to_numpy(np.int64)
+    return chunk
+
+
+# Funkcja nadająca zbiorowi kompaktowe typy po złączeniu fragmentów (int32 i kategorie)
+def compact_events(df: pd.DataFrame) -> pd.DataFrame:
+    df = downcast_ids(df)
+    for col in LATE_CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+# Generator fragmentów z czytelnym błędem zamiast wyjątku parsera (np. tekst w kolumnie liczbowej)
+def _read_chunks(reader):
+    chunks = iter(reader)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except ValueError as e:
+            raise ValueError(
+                f"Plik CSV zawiera nieprawidłowe wartości - kolumny product_id, category_id, user_id "
+                f"i price muszą zawierać liczby ({e})"
+            ) from e
+        yield chunk
+
+
+# Funkcja do zmniejszenia typów identyfikatorów do int32
+def downcast_ids(df: pd.DataFrame) -> pd.DataFrame:
+    int32_info = np.iinfo(np.int32)
+    for col in DOWNCAST_ID_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]) and not df[col].empty:
+            if df[col].min() >= int32_info.min and df[col].max() <= int32_info.max:
+                df[col] = df[col].astype(np.int32)
+    return df
+
+
+# Funkcja przeliczająca postęp jednego przebiegu na część wspólnego paska postępu
+def _progress_segment(progress_callback, start: float, share: float):
+    if progress_callback is None:
+        return None
+    return lambda done, total: progress_callback(int(total * start + done * share), total)
+
+
+# Funkcja do wyznaczenia aktywności klientów (liczba zdarzeń i suma wartości zdarzeń) - czytane są tylko
+# kolumny user_id i price, a w pamięci jest jeden wiersz na klienta (None, jeśli plik nie ma user_id)
+@profiled()
+def user_activity(source, chunksize: int = DEFAULT_CHUNKSIZE, progress_callback=None):
+    total_bytes = _source_size(source)
+    source.seek(0)
+
+    activity = None
+    with pd.read_csv(source, usecols=lambda col: col in ACTIVITY_DTYPES, dtype=ACTIVITY_DTYPES,
+                     chunksize=chunksize) as reader:
+        for chunk in _read_chunks(reader):
+            if "user_id" not in chunk.columns:
+                return None
+            chunk = chunk.dropna(subset=["user_id"])
+            prices = chunk["price"].astype(np.float64) if "price" in chunk.columns else pd.Series(0.0, index=chunk.index)
+            part = prices.groupby(chunk["user_id"]).agg(["size", "sum"]).set_axis(["events", "spend"], axis=1)
+            activity = part if activity is None else activity.add(part, fill_value=0)
+
+            if progress_callback is not None:
+                progress_callback(min(source.tell(), total_bytes), total_bytes)
+    source.seek(0)
+    return activity
+
+
+# Funkcja do podziału wartości na przedziały kwantylowe (powtarzające się progi są łączone)
+def _quantile_bins(values: np.ndarray, levels) -> np.ndarray:
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    thresholds = np.unique(np.quantile(values, levels))
+    return np.searchsorted(thresholds, values, side="right")
+
+
+# Funkcja przypisująca klientom warstwy: przedział liczby zdarzeń x przedział sumy wartości
+# (klienci bez żadnej wartości tworzą osobny przedział)
+def activity_strata(activity: pd.DataFrame) -> np.ndarray:
+    levels = SAMPLE_STRATA_LEVELS
+    event_bins = _quantile_bins(activity["events"].to_numpy(), levels)
+    spend = activity["spend"].to_numpy()
+    spend_bins = np.zeros(len(spend), dtype=np.int64)
+    positive = spend > 0
+    spend_bins[positive] = 1 + _quantile_bins(spend[positive], levels)
+    return event_bins * (len(levels) + 2) + spend_bins
+
+
+# Funkcja do wyboru warstwowej próbki klientów: z każdej warstwy ten sam udział klientów (co najmniej jeden),
+# więc rzadcy, najaktywniejsi i najcenniejsi klienci nie wypadają z próbki, a kwartyle RFM i sumy Monetary
+# zachowują proporcje. W warstwie klienci są wybierani wg skrótu user_id - ten sam plik i udział dają tę samą próbkę
+def stratified_user_sample(activity: pd.DataFrame, fraction: float) -> np.ndarray:
+    users = activity.index.to_numpy(np.int64)
+    if len(users) == 0:
+        return users
+    strata = activity_strata(activity)
+    order = np.lexsort((hash64(users), strata))
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    ranks = np.arange(len(order)) - np.repeat(starts, sizes)
+    quotas = np.maximum(np.round(fraction * sizes), 1)
+    return np.sort(users[order[ranks < np.repeat(quotas, sizes)]])
+
+
+# Funkcja zostawiająca zdarzenia klientów z próbki (posortowana tablica user_id) - klient trafia do próbki
+# ze wszystkimi swoimi zdarzeniami, niezależnie od fragmentu pliku, w którym się pojawiają
+def sample_users(chunk: pd.DataFrame, sampled_users: np.ndarray) -> pd.DataFrame:
+    user_ids = chunk["user_id"].to_numpy(np.int64)
+    if len(sampled_users):
+        positions = np.searchsorted(sampled_users, user_ids).clip(max=len(sampled_users) - 1)
+        in_sample = sampled_users[positions] == user_ids
+    else:
+        in_sample = np.zeros(len(user_ids), dtype=bool)
+    sample = chunk[in_sample].reset_index(drop=True)
+    # Słowniki kategorii (np. user_session) zawierają wartości całego fragmentu - zostawiamy tylko użyte
+    for col in sample.select_dtypes("category").columns:
+        sample[col] = sample[col].cat.remove_unused_categories()
+    return sample
+
+
+# Generator fragmentów CSV z jawnym schematem i sparsowanym event_time (bez łączenia w jeden DataFrame)
+# user_fraction < 1 zostawia tylko zdarzenia warstwowej próbki klientów (dodatkowy przebieg po user_id i price)
+def iter_events_csv(source, chunksize: int = DEFAULT_CHUNKSIZE, progress_callback=None, user_fraction: float = 1.0):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            yield from iter_events_csv(handle, chunksize, progress_callback, user_fraction)
+        return
+
+    total_bytes = _source_size(source)
+    sampled_users = None
+    if user_fraction < 1:
+        activity = user_activity(source, chunksize, _progress_segment(progress_callback, 0, ACTIVITY_PASS_SHARE))
+        if activity is not None:
+            sampled_users = stratified_user_sample(activity, user_fraction)
+        del activity
+        progress_callback = _progress_segment(progress_callback, ACTIVITY_PASS_SHARE, 1 - ACTIVITY_PASS_SHARE)
+    source.seek(0)
+
+    with pd.read_csv(source, dtype=READ_DTYPES, chunksize=chunksize) as reader:
+        for chunk in _read_chunks(reader):
+            chunk = complete_ids(chunk)
+            if sampled_users is not None:
+                chunk = sample_users(chunk, sampled_users)
+            if "event_time" in chunk.columns:
+                chunk["event_time"] = parse_event_time(chunk["event_time"])
+            yield chunk
+
+            if progress_callback is not None:
+                # Rzeczywista liczba przeczytanych bajtów zamiast symulowanych etapów
+                progress_callback(min(source.tell(), total_bytes), total_bytes)
+
+    if progress_callback is not None:
+        progress_callback(total_bytes, total_bytes)
+
+
+# Funkcja do strumieniowego wczytywania CSV z jawnym schematem
+@profiled()
+def read_events_csv(source, chunksize: int = DEFAULT_CHUNKSIZE, progress_callback=None,
+                    user_fraction: float = 1.0) -> pd.DataFrame:
+    chunks = list(iter_events_csv(source, chunksize, progress_callback, user_fraction))
+    if not chunks:
+        return pd.DataFrame(columns=list(EVENT_DTYPES))
+
+    df = concat_chunks(chunks)
+    df = compact_events(df)
+    # Zbiór trzymamy posortowany po czasie - zakresy dat wybieramy wyszukiwaniem binarnym
+    if "event_time" in df.columns:
+        df = sort_by_event_time(df)
+    return df
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from app.core.basket import to_sparse_frame
+from app.core.profiling import profiled
+
+# Liczba ustawionych bitów dla każdej wartości bajtu (zliczanie wsparcia na spakowanych bitmapach)
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+# Funkcja do usunięcia produktów poniżej progu wsparcia jeszcze przed generowaniem kandydatów
+def prune_infrequent_items(matrix, item_labels, min_support: float):
+    n_baskets = matrix.shape[0]
+    item_counts = matrix.getnnz(axis=0)
+    frequent = np.flatnonzero(item_counts / n_baskets >= min_support) if n_baskets else np.array([], dtype=int)
+    return matrix[:, frequent].tocsc(), item_labels[frequent], item_counts[frequent]
+
+
+def _popcount(bitmap: np.ndarray) -> int:
+    return int(POPCOUNT_TABLE[bitmap].sum(dtype=np.int64))
+
+
+def _itemsets_frame(supports: list, itemsets: list) -> pd.DataFrame:
+    return pd.DataFrame({"support": supports, "itemsets": itemsets}, columns=["support", "itemsets"])
+
+
+# Wyszukiwanie częstych zbiorów metodą Eclat na pionowych bitmapach (koszyki spakowane po 8 w bajcie)
+def eclat(matrix, item_labels, min_support: float, max_len=None) -> pd.DataFrame:
+    n_baskets = matrix.shape[0]
+    matrix, item_labels, item_counts = prune_infrequent_items(matrix, item_labels, min_support)
+    n_items = matrix.shape[1]
+
+    supports = list(item_counts / n_baskets)
+    itemsets = [frozenset([label]) for label in item_labels]
+    if n_items < 2 or (max_len is not None and max_len < 2):
+        return _itemsets_frame(supports, itemsets)
+
+    # Liczności wszystkich par jednym iloczynem macierzy rzadkich
+    counts_matrix = matrix.astype(np.int32)
+    pair_counts = (counts_matrix.T @ counts_matrix).tocsr()
+    pair_counts.setdiag(0)
+    pair_counts.eliminate_zeros()
+
+    neighbours = []
+    for i in range(n_items):
+        row = pair_counts.indptr[i], pair_counts.indptr[i + 1]
+        columns = pair_counts.indices[row[0]:row[1]]
+        values = pair_counts.data[row[0]:row[1]]
+        keep = (columns > i) & (values / n_baskets >= min_support)
+        neighbours.append(dict(zip(columns[keep].tolist(), values[keep].tolist())))
+
+    for i in range(n_items):
+        for j, count in sorted(neighbours[i].items()):
+            supports.append(count / n_baskets)
+            itemsets.append(frozenset([item_labels[i], item_labels[j]]))
+
+    if max_len is not None and max_len < 3:
+        return _itemsets_frame(supports, itemsets)
+
+    # Bitmapy tylko dla koszyków z co najmniej dwoma częstymi produktami i tylko dla produktów z częstymi parami
+    relevant_rows = np.flatnonzero(matrix.tocsr().getnnz(axis=1) >= 2)
+    reduced = matrix.tocsr()[relevant_rows].tocsc()
+    bitmaps = {}
+
+    def item_bitmap(item):
+        if item not in bitmaps:
+            column = np.zeros(len(relevant_rows), dtype=bool)
+            column[reduced.indices[reduced.indptr[item]:reduced.indptr[item + 1]]] = True
+            bitmaps[item] = np.packbits(column)
+        return bitmaps[item]
+
+    def extend(prefix, prefix_bitmap, candidates):
+        for position, item in enumerate(candidates):
+            bitmap = prefix_bitmap & item_bitmap(item)
+            count = _popcount(bitmap)
+            if count / n_baskets < min_support:
+                continue
+            itemset = prefix + (item,)
+            supports.append(count / n_baskets)
+            itemsets.append(frozenset(item_labels[k] for k in itemset))
+            if max_len is None or len(itemset) < max_len:
+                # Kandydat musi tworzyć częstą parę z każdym elementem prefiksu
+                next_candidates = [k for k in candidates[position + 1:] if k in neighbours[item]]
+                if next_candidates:
+                    extend(itemset, bitmap, next_candidates)
+
+    for i in range(n_items):
+        pair_items = sorted(neighbours[i])
+        for position, j in enumerate(pair_items):
+            candidates = [k for k in pair_items[position + 1:] if k in neighbours[j]]
+            if candidates:
+                extend((i, j), item_bitmap(i) & item_bitmap(j), candidates)
+
+    return _itemsets_frame(supports, itemsets)
+
+
+# Wyszukiwanie częstych zbiorów algorytmami z mlxtend na macierzy po odcięciu rzadkich produktów
+# (mlxtend importujemy dopiero przy pierwszym wyszukiwaniu - nie spowalnia startu aplikacji)
+def _mlxtend_engine(algorithm_name: str):
+    def mine(matrix, item_labels, min_support: float, max_len=None) -> pd.DataFrame:
+        from mlxtend import frequent_patterns
+
+        pruned, pruned_labels, _ = prune_infrequent_items(matrix, item_labels, min_support)
+        if pruned.shape[1] == 0:
+            return _itemsets_frame([], [])
+        frame = to_sparse_frame(pruned.tocsr(), pruned_labels)
+        algorithm = getattr(frequent_patterns, algorithm_name)
+        return algorithm(frame, min_support=min_support, use_colnames=True, max_len=max_len)
+    return mine
+
+
+MINING_ENGINES = {
+    "fpgrowth": _mlxtend_engine("fpgrowth"),
+    "eclat": eclat,
+    "apriori": _mlxtend_engine("apriori"),
+}
+
+
+# Funkcja do wyszukiwania częstych zbiorów wybranym silnikiem (wynik w formacie mlxtend: support, itemsets)
+@profiled()
+def mine_frequent_itemsets(matrix, item_labels, min_support: float, max_len=None, engine: str = "fpgrowth") -> pd.DataFrame:
+    return MINING_ENGINES[engine](matrix, item_labels, min_support, max_len)
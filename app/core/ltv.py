@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from app.core.profiling import profiled
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+# Funkcja do obliczania LTV na użytkownika (czysta - nie modyfikuje przekazanego DataFrame)
+# LTV = suma (cena / liczba dni od pierwszego zdarzenia klienta), 0 dni liczone jako 1
+@profiled()
+def calculate_ltv(df: pd.DataFrame) -> pd.DataFrame:
+    user_ids = df['user_id'].to_numpy()
+    event_times = df['event_time'].to_numpy().view(np.int64)
+    prices = np.nan_to_num(df['price'].to_numpy(dtype=np.float64), nan=0.0)
+
+    if len(user_ids) == 0:
+        return pd.DataFrame({'user_id': user_ids, 'Total_Revenue': prices,
+                             'Total_Days': np.array([], dtype=np.int64), 'LTV': prices})
+
+    # Jedno sortowanie po użytkowniku, a potem redukcje na ciągłych segmentach
+    order = np.argsort(user_ids, kind='stable')
+    sorted_users = user_ids[order]
+    sorted_times = event_times[order]
+    sorted_prices = prices[order]
+
+    segment_starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    segment_sizes = np.diff(np.r_[segment_starts, len(sorted_users)])
+
+    first_event = np.minimum.reduceat(sorted_times, segment_starts)
+    days_since_first = (sorted_times - np.repeat(first_event, segment_sizes)) // NS_PER_DAY
+    days_since_first = np.maximum(days_since_first, 1)  # Unikamy dzielenia przez zero
+
+    return pd.DataFrame({
+        'user_id': sorted_users[segment_starts],
+        'Total_Revenue': np.add.reduceat(sorted_prices, segment_starts),
+        'Total_Days': np.maximum.reduceat(days_since_first, segment_starts),
+        'LTV': np.add.reduceat(sorted_prices / days_since_first, segment_starts),
+    })
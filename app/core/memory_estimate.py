@@ -0,0 +1,139 @@
+import io
+import math
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from app.core.dataset_store import COMPACT_BYTES_PER_ROW, MEMORY_BUDGET_MB
+from app.core.ingest import compact_events, concat_chunks, iter_events_csv
+
+# Zestawienie rozmiarów znanych zbiorów: rozmiar pliku, liczba wierszy i zajętość pamięci po zwykłym wczytaniu
+SUMMARY_PATH = os.path.join("data", "raw", "datasets_summary.csv")
+
+# Wartości zastępcze, gdy zestawienia nie ma (średnie dla zbiorów Multistore i Cosmetic)
+DEFAULT_FILE_BYTES_PER_ROW = 130
+DEFAULT_MEMORY_BYTES_PER_ROW = 380
+
+# Ile początkowych bajtów pliku parsujemy, by zmierzyć rozmiar wiersza w pliku i w pamięci
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+# Szczyt pamięci przy wczytywaniu względem rozmiaru wyniku (fragmenty + złączenie + sortowanie po czasie)
+# Pomiar benchmarkiem: ok. 2,1x dla 1 mln wierszy
+INGEST_PEAK_FACTOR = 2.2
+
+# Część wolnej pamięci RAM, którą może zająć wczytywanie (reszta dla innych sesji i systemu)
+MEMORY_SAFETY_FRACTION = float(os.environ.get("MARKETING_APP_MEMORY_SAFETY", 0.7))
+
+# Poniżej tego udziału klientów próbka jest zbyt mała - proponujemy przetwarzanie poza pamięcią
+MIN_SAMPLE_FRACTION = 0.05
+
+
+# Funkcja zwracająca średnie rozmiary wiersza ze zestawienia zbiorów (w pliku i w pamięci, w bajtach)
+@lru_cache(maxsize=1)
+def summary_ratios() -> dict:
+    try:
+        summary = pd.read_csv(SUMMARY_PATH)
+    except (OSError, ValueError):
+        summary = None
+    if summary is None or summary.empty:
+        return {"file_bytes_per_row": DEFAULT_FILE_BYTES_PER_ROW, "memory_bytes_per_row": DEFAULT_MEMORY_BYTES_PER_ROW}
+
+    # Tylko zbiory zdarzeń w schemacie szablonu (9 kolumn) - pozostałe mają inną strukturę
+    events = summary[(summary["Columns"] == 9) & (summary["Rows"] > 0)]
+    rows = events["Rows"].sum()
+    return {
+        "file_bytes_per_row": events["File Size (MB)"].sum() * 1024 * 1024 / rows,
+        "memory_bytes_per_row": events["Memory Usage (MB)"].sum() * 1024 * 1024 / rows,
+    }
+
+
+def _source_bytes(source) -> int:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, "size", None)
+    if size is not None:
+        return int(size)
+    source.seek(0, os.SEEK_END)
+    return source.tell()
+
+
+def _read_prefix(source, size: int) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            return handle.read(size)
+    source.seek(0)
+    prefix = source.read(size)
+    source.seek(0)
+    return prefix
+
+
+# Funkcja do wczytania początku pliku (pełne wiersze) z tym samym schematem co przy pełnym wczytaniu
+def sample_prefix(source, sample_bytes: int = SAMPLE_BYTES) -> tuple:
+    prefix = _read_prefix(source, sample_bytes)
+    complete = len(prefix) < sample_bytes
+    if not complete:
+        prefix = prefix[:prefix.rfind(b"\n") + 1]
+    chunks = list(iter_events_csv(io.BytesIO(prefix)))
+    if not chunks:
+        return pd.DataFrame(), len(prefix), complete
+    return compact_events(concat_chunks(chunks)), len(prefix), complete
+
+
+# Funkcja do oszacowania rozmiaru zbioru w pamięci przed wczytaniem (z próbki początku pliku)
+# Słowniki kategorii w próbce przypadają na mniej wierszy niż w całym pliku, więc wynik jest raczej zawyżony
+def estimate_memory(source) -> dict:
+    file_bytes = _source_bytes(source)
+    ratios = summary_ratios()
+    sample, sample_bytes, complete = sample_prefix(source)
+
+    if len(sample):
+        rows = len(sample) if complete else int(file_bytes * len(sample) / sample_bytes)
+        row_bytes = max(sample.memory_usage(deep=True).sum() / len(sample), COMPACT_BYTES_PER_ROW)
+    else:
+        rows = int(file_bytes / ratios["file_bytes_per_row"])
+        row_bytes = COMPACT_BYTES_PER_ROW
+
+    compact_mb = rows * row_bytes / (1024 * 1024)
+    return {
+        "rows": rows,
+        "file_mb": file_bytes / (1024 * 1024),
+        "compact_mb": compact_mb,
+        "peak_mb": compact_mb * INGEST_PEAK_FACTOR,
+        # Dla porównania: zwykłe pd.read_csv (typy object i int64), jak w zestawieniu zbiorów
+        "naive_mb": rows * ratios["memory_bytes_per_row"] / (1024 * 1024),
+    }
+
+
+# Funkcja zwracająca ilość wolnej pamięci RAM (psutil jest opcjonalny - bez niego odczyt z sysconf)
+def available_memory_mb():
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Funkcja wybierająca sposób wczytania: całość (kompaktowe typy), próbka klientów lub przetwarzanie poza pamięcią
+# Limit to mniejsza z wartości: bezpieczna część wolnego RAM i budżet pamięci zbiorów w procesie serwera
+def plan_load(estimate: dict, available_mb=None, budget_mb: float = MEMORY_BUDGET_MB) -> dict:
+    limit_mb = budget_mb
+    if available_mb is not None:
+        limit_mb = min(limit_mb, available_mb * MEMORY_SAFETY_FRACTION)
+
+    fits = estimate["peak_mb"] <= limit_mb
+    # Udział klientów, przy którym wczytanie zmieści się w limicie (w pełnych procentach, w dół)
+    fraction = math.floor(100 * limit_mb / estimate["peak_mb"]) / 100 if estimate["peak_mb"] else 1.0
+    fraction = min(max(fraction, 0.01), 1.0)
+
+    if fits:
+        recommended = "full"
+    elif fraction >= MIN_SAMPLE_FRACTION:
+        recommended = "sample"
+    else:
+        recommended = "out_of_core"
+    return {"fits": fits, "limit_mb": limit_mb, "sample_fraction": fraction, "recommended": recommended}
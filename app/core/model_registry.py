@@ -0,0 +1,69 @@
+import json
+import os
+import re
+import threading
+import time
+
+from app.core.dataset_cache import temp_path
+
+# Katalog z wytrenowanymi w aplikacji modelami KMeans (kolejne wersje nie nadpisują poprzednich)
+MODEL_DIR = os.environ.get("MARKETING_APP_MODEL_DIR", os.path.join("models", "registry"))
+
+_VERSION_PATTERN = re.compile(r"^kmeans_v(\d+)\.json$")
+_lock = threading.Lock()
+
+
+def _model_path(version: int) -> str:
+    return os.path.join(MODEL_DIR, f"kmeans_v{version:03d}.joblib")
+
+
+def _meta_path(version: int) -> str:
+    return os.path.join(MODEL_DIR, f"kmeans_v{version:03d}.json")
+
+
+def _versions() -> list:
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    matches = (_VERSION_PATTERN.match(file_name) for file_name in os.listdir(MODEL_DIR))
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+# Funkcja do zapisu modelu jako kolejnej wersji wraz z opisem (parametry, metryki, źródło danych)
+def register_model(model, metadata: dict) -> int:
+    import joblib
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with _lock:
+        versions = _versions()
+        version = versions[-1] + 1 if versions else 1
+
+        # Najpierw model, potem opis - lista wersji widzi tylko kompletne wpisy
+        # Oba pliki zapisujemy pod unikalną nazwą tymczasową i podmieniamy - list_models w innej sesji
+        # nie odczyta w połowie zapisanego opisu
+        tmp_path = temp_path(_model_path(version))
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, _model_path(version))
+
+        meta = dict(metadata, version=version, path=_model_path(version),
+                    created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        tmp_path = temp_path(_meta_path(version))
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(meta, handle, ensure_ascii=False, default=str)
+        os.replace(tmp_path, _meta_path(version))
+    return version
+
+
+# Funkcja zwracająca opisy zapisanych modeli (od najnowszego)
+def list_models() -> list:
+    models = []
+    for version in reversed(_versions()):
+        with open(_meta_path(version), encoding="utf-8") as handle:
+            models.append(json.load(handle))
+    return models
+
+
+# Funkcja do wczytania modelu w podanej wersji
+def load_registered_model(version: int):
+    import joblib
+
+    return joblib.load(_model_path(version))
@@ -0,0 +1,196 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Plik z pomiarami etapów w formacie JSON Lines (pusta wartość wyłącza zapis do pliku)
+PERF_LOG_PATH = os.environ.get("MARKETING_APP_PERF_LOG", os.path.join("logs", "performance.jsonl"))
+
+# Co ile sekund odczytujemy pamięć procesu w trakcie etapu (szczyt RSS)
+PEAK_SAMPLE_INTERVAL_S = 0.01
+
+# Liczba pomiarów pamiętanych w sesji i pokazywanych w panelu
+SESSION_HISTORY_SIZE = 100
+PANEL_ROWS = 20
+
+_file_lock = threading.Lock()
+_local = threading.local()
+
+
+def _process():
+    # psutil jest opcjonalny - bez niego mierzymy tylko czas
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+
+def _rss_mb(process) -> float:
+    return process.memory_info().rss / (1024 * 1024)
+
+
+class _PeakRSS:
+    # Wątek próbkujący pamięć procesu w trakcie etapu (RSS przed i po nie pokazuje chwilowego szczytu)
+
+    def __init__(self, process, interval: float = PEAK_SAMPLE_INTERVAL_S):
+        self.process = process
+        self.interval = interval
+        self.start = self.peak = self.end = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.process is not None:
+            self.start = self.peak = _rss_mb(self.process)
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb(self.process))
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.end = _rss_mb(self.process)
+            self.peak = max(self.peak, self.end)
+
+
+# Funkcja zwracająca liczbę wierszy wyniku (DataFrame, tablica, krotka z tablicą na początku), None dla innych
+def row_count(value):
+    if isinstance(value, tuple) and value:
+        return row_count(value[0])
+    shape = getattr(value, "shape", None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def _session_context():
+    # Poza aplikacją (CLI, benchmarki) nie importujemy Streamlit tylko po to, by sprawdzić sesję
+    if "streamlit" not in sys.modules:
+        return None, None
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None, None
+    return st, st.session_state.get("dataset_key")
+
+
+def _emit(record: dict) -> None:
+    st, dataset_key = _session_context()
+    record["dataset"] = dataset_key
+    if st is not None:
+        history = st.session_state.setdefault("performance_log", [])
+        history.append(record)
+        del history[:-SESSION_HISTORY_SIZE]
+
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    logger.info(line)
+    if PERF_LOG_PATH:
+        try:
+            os.makedirs(os.path.dirname(PERF_LOG_PATH) or ".", exist_ok=True)
+            with _file_lock, open(PERF_LOG_PATH, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+        except OSError as e:
+            logger.warning("Nie udało się zapisać pomiaru do %s: %s", PERF_LOG_PATH, e)
+
+
+# Pomiar etapu: czas, pamięć procesu (RSS na starcie, szczyt i zmiana), wiersze na wejściu/wyjściu, trafienie w cache
+# Wartości rows_out i cache_hit można uzupełnić w zwróconym słowniku wewnątrz bloku
+@contextmanager
+def profile_stage(name: str, rows_in=None):
+    stack = _local.__dict__.setdefault("stack", [])
+    record = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "stage": name,
+        "parent": stack[-1] if stack else None,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "cache_hit": None,
+    }
+    stack.append(name)
+    started = time.perf_counter()
+    memory = _PeakRSS(_process())
+    try:
+        with memory:
+            yield record
+    finally:
+        stack.pop()
+        record["wall_s"] = round(time.perf_counter() - started, 4)
+        if memory.start is not None:
+            record["rss_mb"] = round(memory.start, 1)
+            record["peak_rss_delta_mb"] = round(memory.peak - memory.start, 1)
+            record["rss_delta_mb"] = round(memory.end - memory.start, 1)
+        _emit(record)
+
+
+# Dekorator mierzący wywołanie funkcji (wiersze wejścia - z pierwszego argumentu z danymi, wyjścia - z wyniku)
+def profiled(name: str = None):
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = next((rows for rows in map(row_count, args) if rows is not None), None)
+            with profile_stage(stage_name, rows_in) as stage:
+                result = func(*args, **kwargs)
+                stage["rows_out"] = row_count(result)
+            return result
+        return wrapper
+    return decorator
+
+
+# Pobranie wyniku z cache (LRUCache) z pomiarem - przy braku w cache obliczenia są mierzone razem z wyszukaniem
+def cached_stage(name: str, cache, key, compute, rows_in=None):
+    with profile_stage(name, rows_in) as stage:
+        computed = []
+
+        def run():
+            computed.append(True)
+            return compute()
+
+        result = cache.get_or_compute(key, run)
+        stage["cache_hit"] = not computed
+        stage["rows_out"] = row_count(result)
+    return result
+
+
+# Opcjonalny panel na pasku bocznym z ostatnimi pomiarami bieżącej sesji
+def render_performance_panel() -> None:
+    import pandas as pd
+    import streamlit as st
+
+    history = st.session_state.get("performance_log")
+    if not history or not st.sidebar.toggle("⏱️ Wydajność", key="performance_panel"):
+        return
+
+    records = pd.DataFrame(history[-PANEL_ROWS:][::-1])
+    columns = {
+        "stage": "Etap",
+        "wall_s": "Czas [s]",
+        "peak_rss_delta_mb": "Szczyt RSS [MB]",
+        "rss_delta_mb": "Zmiana RSS [MB]",
+        "rows_in": "Wiersze (wejście)",
+        "rows_out": "Wiersze (wynik)",
+        "cache_hit": "Cache",
+    }
+    records = records[[col for col in columns if col in records.columns]].rename(columns=columns)
+    st.sidebar.dataframe(records, hide_index=True)
+
+    computed = [record for record in history if not record.get("cache_hit")]
+    if computed:
+        slowest = max(computed, key=lambda record: record["wall_s"])
+        st.sidebar.caption(f"Najwolniejszy etap: **{slowest['stage']}** ({slowest['wall_s']:.2f} s)")
+    if "rss_mb" not in history[-1]:
+        st.sidebar.caption("Pomiar pamięci wymaga pakietu psutil.")
@@ -0,0 +1,196 @@
+import os
+import threading
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+
+from app.core.cube import build_daily_users_hll, build_revenue_cube
+from app.core.dataset_cache import CACHE_DIR, DICTIONARY_COLUMNS
+from app.core.ingest import downcast_ids
+from app.core.ltv import calculate_ltv
+from app.core.profiling import profiled
+from app.core.rfm import build_user_daily_rollup
+from app.core.sketches import USER_SAMPLE_BUCKETS, user_sample_fraction, user_sample_mask
+from app.core.time_index import date_bounds, slice_date_range
+
+# Tabele pochodne budowane raz przy wczytywaniu zbioru (zapisywane obok kopii Parquet)
+ARTIFACT_BUILDERS = {
+    'user_daily': build_user_daily_rollup,
+    'revenue_cube': build_revenue_cube,
+    'users_hll': build_daily_users_hll,
+}
+
+# Kolumny potrzebne do obliczenia LTV
+LTV_COLUMNS = ['user_id', 'event_time', 'price']
+
+# Limit pamięci DuckDB - powyżej niego pośrednie wyniki są zapisywane na dysk
+DUCKDB_MEMORY_LIMIT_MB = int(os.environ.get("MARKETING_APP_DUCKDB_MEMORY_MB", 2048))
+DUCKDB_TEMP_DIR = os.path.join(CACHE_DIR, "duckdb_tmp")
+
+
+# Funkcja zamieniająca zakres dat (włącznie) na półotwarty przedział czasu [start, koniec)
+def _time_range(start_date, end_date):
+    return datetime.combine(start_date, time.min), datetime.combine(end_date, time.min) + timedelta(days=1)
+
+
+class PandasBackend:
+    # Obliczenia na zbiorze trzymanym w pamięci serwera (rejestr zbiorów)
+    name = "pandas"
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    @property
+    def columns(self) -> list:
+        return list(self.df.columns)
+
+    def row_count(self) -> int:
+        return len(self.df)
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.df.head(n)
+
+    def date_bounds(self):
+        return date_bounds(self.df)
+
+    # Zdarzenia z zakresu dat (opcjonalnie tylko wybranego typu i wybrane kolumny)
+    def events(self, start_date=None, end_date=None, columns: list = None, event_type: str = None) -> pd.DataFrame:
+        data = self.df if start_date is None else slice_date_range(self.df, start_date, end_date)
+        if event_type is not None:
+            data = data[data['event_type'] == event_type]
+        return data if columns is None else data[columns]
+
+    # user_fraction < 1 liczy LTV tylko dla próbki klientów (wybranych wg skrótu user_id)
+    def ltv(self, start_date, end_date, user_fraction: float = 1.0) -> pd.DataFrame:
+        data = slice_date_range(self.df, start_date, end_date)
+        if user_fraction < 1:
+            data = data.loc[user_sample_mask(data['user_id'].to_numpy(), user_fraction), LTV_COLUMNS]
+        return calculate_ltv(data)
+
+    def build_artifact(self, name: str) -> pd.DataFrame:
+        return ARTIFACT_BUILDERS[name](self.df)
+
+
+class DuckDBBackend:
+    # Obliczenia poza pamięcią: zapytania SQL DuckDB bezpośrednio na plikach Parquet z cache
+    # Wczytywane są tylko potrzebne kolumny i wiersze, a duże agregacje mogą korzystać z dysku
+    name = "duckdb"
+
+    def __init__(self, sources: list, memory_limit_mb: int = DUCKDB_MEMORY_LIMIT_MB):
+        import duckdb
+
+        os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+        self.sources = list(sources)
+        self._connection = duckdb.connect()
+        self._connection.execute(f"SET memory_limit = '{int(memory_limit_mb)}MB'")
+        self._connection.execute(f"SET temp_directory = '{_sql_string(DUCKDB_TEMP_DIR)}'")
+        self._connection.execute("SET preserve_insertion_order = false")
+        paths = ", ".join(f"'{_sql_string(path)}'" for path in self.sources)
+        self._connection.execute(f"CREATE VIEW events AS SELECT * FROM read_parquet([{paths}])")
+        self._lock = threading.Lock()
+        self._summary = None
+
+    # Każde zapytanie na osobnym kursorze - połączenie jest współdzielone przez sesje
+    def _query(self, sql: str, params: list = None) -> pd.DataFrame:
+        with self._lock:
+            cursor = self._connection.cursor()
+        try:
+            table = cursor.execute(sql, params or []).arrow()
+            if hasattr(table, 'read_all'):
+                table = table.read_all()
+        finally:
+            cursor.close()
+        df = table.to_pandas()
+        for col in DICTIONARY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return downcast_ids(df)
+
+    @property
+    def columns(self) -> list:
+        return list(self._query("SELECT * FROM events LIMIT 0").columns)
+
+    # Liczba wierszy i zakres dat - pliki się nie zmieniają, więc liczymy je raz
+    def _dataset_summary(self) -> pd.Series:
+        if self._summary is None:
+            self._summary = self._query(
+                "SELECT count(*) AS n, min(event_time) AS first, max(event_time) AS last FROM events"
+            ).iloc[0]
+        return self._summary
+
+    def row_count(self) -> int:
+        return int(self._dataset_summary()['n'])
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self._query(f"SELECT * FROM events ORDER BY event_time LIMIT {int(n)}")
+
+    def date_bounds(self):
+        summary = self._dataset_summary()
+        return summary['first'].date(), summary['last'].date()
+
+    def events(self, start_date=None, end_date=None, columns: list = None, event_type: str = None) -> pd.DataFrame:
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("event_time >= ? AND event_time < ?")
+            params += list(_time_range(start_date, end_date))
+        if event_type is not None:
+            conditions.append("event_type = ?")
+            params.append(event_type)
+        select = "*" if columns is None else ", ".join(f'"{col}"' for col in columns)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"SELECT {select} FROM events {where} ORDER BY event_time", params)
+
+    # LTV jak w calculate_ltv: suma (cena / liczba dni od pierwszego zdarzenia klienta), 0 dni liczone jako 1
+    @profiled()
+    def ltv(self, start_date, end_date, user_fraction: float = 1.0) -> pd.DataFrame:
+        params = list(_time_range(start_date, end_date))
+        sample = ""
+        if user_fraction < 1:
+            sample = "AND hash(user_id) % ? < ?"
+            params += [USER_SAMPLE_BUCKETS, round(user_sample_fraction(user_fraction) * USER_SAMPLE_BUCKETS)]
+        ltv = self._query(f"""
+            WITH ranged AS (
+                SELECT user_id, epoch_ns(event_time) AS ts, coalesce(price, 0)::DOUBLE AS price
+                FROM events WHERE event_time >= ? AND event_time < ? {sample}
+            ), with_days AS (
+                SELECT user_id, price,
+                       greatest((ts - min(ts) OVER (PARTITION BY user_id)) // 86400000000000, 1) AS days
+                FROM ranged
+            )
+            SELECT user_id, sum(price) AS Total_Revenue, max(days) AS Total_Days, sum(price / days) AS LTV
+            FROM with_days GROUP BY user_id ORDER BY user_id
+        """, params)
+        ltv['Total_Days'] = ltv['Total_Days'].astype('int64')
+        return ltv
+
+    def build_artifact(self, name: str) -> pd.DataFrame:
+        if name == 'user_daily':
+            rollup = self._query("""
+                SELECT date_trunc('day', event_time) AS day, user_id, max(event_time) AS Last_Event,
+                       count(event_type)::INTEGER AS Events, coalesce(sum(price), 0)::DOUBLE AS Revenue
+                FROM events GROUP BY ALL ORDER BY day, user_id
+            """)
+            return _normalize_times(rollup, ['day', 'Last_Event'])
+        if name == 'revenue_cube':
+            cube = self._query("""
+                SELECT date_trunc('day', event_time) AS day, hour(event_time)::TINYINT AS hour, event_type,
+                       count(*) AS events, count(price) AS priced_events, coalesce(sum(price), 0)::DOUBLE AS revenue
+                FROM events GROUP BY ALL ORDER BY day, hour, event_type
+            """)
+            return _normalize_times(cube, ['day'])
+        if name == 'users_hll':
+            # Szkic dzienny zależy tylko od par (dzień, użytkownik) - wystarczą unikalne pary zamiast zdarzeń
+            pairs = self._query("SELECT DISTINCT date_trunc('day', event_time) AS event_time, user_id FROM events")
+            return build_daily_users_hll(_normalize_times(pairs, ['event_time']))
+        raise KeyError(f"Nieznana tabela pochodna: {name}")
+
+
+def _sql_string(value: str) -> str:
+    return str(value).replace("'", "''")
+
+
+# Funkcja do ujednolicenia typów dat z DuckDB z typami z pandas (datetime64[ns])
+def _normalize_times(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    for col in columns:
+        df[col] = df[col].astype('datetime64[ns]')
+    return df
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+# Domyślna maksymalna liczba punktów wysyłanych do przeglądarki na jednym wykresie
+DEFAULT_POINT_BUDGET = 20_000
+
+# Minimalna liczba punktów każdego segmentu w próbce (małe segmenty nie znikają z wykresu)
+MIN_POINTS_PER_SEGMENT = 200
+
+
+# Funkcja do policzenia histogramu po stronie serwera - do przeglądarki trafiają tylko liczności koszyków
+def histogram_counts(values, nbins: int = 30) -> pd.DataFrame:
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=nbins)
+    return pd.DataFrame({
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'bin_center': (edges[:-1] + edges[1:]) / 2,
+        'count': counts,
+    })
+
+
+# Funkcja do próbkowania warstwowego (proporcjonalnie do wielkości segmentu) z limitem liczby punktów
+def stratified_sample(df: pd.DataFrame, by: str, max_points: int = DEFAULT_POINT_BUDGET, seed: int = 0) -> pd.DataFrame:
+    if len(df) <= max_points:
+        return df
+
+    codes, _ = pd.factorize(df[by])
+    group_sizes = np.bincount(codes + 1)[1:]  # Kod -1 (brak segmentu) pomijamy
+    quotas = np.maximum(
+        np.floor(group_sizes * max_points / len(df)),
+        np.minimum(group_sizes, MIN_POINTS_PER_SEGMENT),
+    ).astype(np.int64)
+
+    # Losowa kolejność wierszy i numer wiersza w obrębie segmentu - zostawiamy pierwsze "quota" z każdego
+    order = np.random.default_rng(seed).permutation(len(df))
+    order = order[codes[order] >= 0]
+    shuffled_codes = codes[order]
+    rank_in_group = pd.Series(shuffled_codes).groupby(shuffled_codes).cumcount().to_numpy()
+    selected = order[rank_in_group < quotas[shuffled_codes]]
+    return df.iloc[np.sort(selected)]
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+
+class LRUCache:
+    # Ograniczony rozmiarem cache wyników (usuwa najdawniej używane wpisy), bezpieczny dla wielu sesji
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Obliczenia poza blokadą - inne sesje mogą w tym czasie korzystać z cache
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Funkcja zwracająca wspólny dla procesu cache wyników o podanej nazwie
+@st.cache_resource
+def get_result_cache(name: str, max_entries: int = 16) -> LRUCache:
+    return LRUCache(max_entries)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from app.core.profiling import profiled
+from app.core.time_index import slice_day_range
+
+# Progi kwartylowe używane do punktacji R, F i M (wyniki 1-4)
+QUANTILE_LEVELS = (0.25, 0.50, 0.75)
+
+# Monetary zaokrąglane do groszy - sumy z agregatu i z surowych zdarzeń dają wtedy te same wyniki punktacji
+MONETARY_DECIMALS = 2
+
+RFM_COLUMNS = [
+    'user_id', 'Recency', 'Frequency', 'Monetary',
+    'Recency_Score', 'Frequency_Score', 'Monetary_Score',
+    'Customer_RFM_Score', 'Customer_Category',
+]
+
+
+# Reguły kategoryzacji klienta na podstawie wyników R, F, M (każdy od 1 do 4)
+def categorize_scores(recency_score: int, frequency_score: int, monetary_score: int) -> str:
+    if recency_score in (2, 3, 4) and frequency_score == 4 and monetary_score == 4:
+        return 'Champion'
+    elif recency_score == 3 and monetary_score in (3, 4):
+        return 'Top Loyal Customer'
+    elif recency_score == 3 and monetary_score in (1, 2):
+        return 'Loyal Customer'
+    elif recency_score == 4 and monetary_score in (3, 4):
+        return 'Top Recent Customer'
+    elif recency_score == 4 and monetary_score in (1, 2):
+        return 'Recent Customer'
+    elif recency_score in (2, 3) and monetary_score in (3, 4):
+        return 'Top Customer Needed Attention'
+    elif recency_score in (2, 3) and monetary_score in (1, 2):
+        return 'Customer Needed Attention'
+    elif recency_score == 1 and monetary_score in (3, 4):
+        return 'Top Lost Customer'
+    elif recency_score == 1 and monetary_score in (1, 2):
+        return 'Lost Customer'
+    else:
+        return 'Other'
+
+
+# Tablice przejścia z kostki wyników 4x4x4 (kod = 16 * (R-1) + 4 * (F-1) + (M-1))
+_SCORE_CUBE = [(r, f, m) for r in range(1, 5) for f in range(1, 5) for m in range(1, 5)]
+SCORE_LABELS = np.array([f"{r}{f}{m}" for r, f, m in _SCORE_CUBE], dtype=object)
+CATEGORY_LOOKUP = np.array([categorize_scores(r, f, m) for r, f, m in _SCORE_CUBE], dtype=object)
+
+
+# Punktacja "im mniej, tym lepiej" (Recency): <= q25 -> 4, <= q50 -> 3, <= q75 -> 2, w pozostałych 1
+def score_ascending(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    return (len(thresholds) + 1 - np.searchsorted(thresholds, values, side='left')).astype(np.int8)
+
+
+# Punktacja "im więcej, tym lepiej" (Frequency, Monetary): >= q75 -> 4, >= q50 -> 3, >= q25 -> 2, w pozostałych 1
+def score_descending(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    return (1 + np.searchsorted(thresholds, values, side='right')).astype(np.int8)
+
+
+# Funkcja do punktacji i kategoryzacji gotowych wartości R, F, M (jeden wiersz na klienta)
+def score_rfm(df_RFM: pd.DataFrame, quantile_levels=QUANTILE_LEVELS) -> pd.DataFrame:
+    levels = list(quantile_levels)
+    quantiles_R = df_RFM['Recency'].quantile(levels).to_numpy()
+    quantiles_F = df_RFM['Frequency'].quantile(levels).to_numpy()
+    quantiles_M = df_RFM['Monetary'].quantile(levels).to_numpy()
+
+    recency_score = score_ascending(df_RFM['Recency'].to_numpy(), quantiles_R)
+    frequency_score = score_descending(df_RFM['Frequency'].to_numpy(), quantiles_F)
+    monetary_score = score_descending(df_RFM['Monetary'].to_numpy(), quantiles_M)
+
+    df_RFM['Recency_Score'] = recency_score
+    df_RFM['Frequency_Score'] = frequency_score
+    df_RFM['Monetary_Score'] = monetary_score
+
+    code = (recency_score.astype(np.intp) - 1) * 16 + (frequency_score - 1) * 4 + (monetary_score - 1)
+    df_RFM['Customer_RFM_Score'] = SCORE_LABELS[code]
+    df_RFM['Customer_Category'] = CATEGORY_LOOKUP[code]
+    return df_RFM
+
+
+# Funkcja do budowy dziennego agregatu (user_id, dzień) - tworzona raz przy wczytywaniu zbioru
+def build_user_daily_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    day = df['event_time'].to_numpy().astype('datetime64[D]')
+    rollup = df.groupby([day, df['user_id'].to_numpy()], sort=True).agg(
+        Last_Event=('event_time', 'max'),
+        Events=('event_type', 'count'),
+        Revenue=('price', 'sum'),
+    )
+    rollup.index.names = ['day', 'user_id']
+    rollup = rollup.reset_index()
+    rollup['day'] = rollup['day'].astype('datetime64[ns]')
+    rollup['Events'] = rollup['Events'].astype(np.int32)
+    rollup['Revenue'] = rollup['Revenue'].astype(np.float64)
+    return rollup
+
+
+# Funkcja do wyboru wierszy agregatu z zakresu dat (agregat jest posortowany po dniu)
+def slice_rollup(rollup: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    return slice_day_range(rollup, start_date, end_date)
+
+
+# Funkcja do obliczania RFM z dziennego agregatu zamiast z surowych zdarzeń
+@profiled()
+def compute_rfm_from_rollup(rollup: pd.DataFrame, quantile_levels=QUANTILE_LEVELS) -> pd.DataFrame:
+    reference_time = rollup['Last_Event'].max()
+
+    df_RFM = rollup.groupby('user_id', sort=True).agg(
+        Last_Event=('Last_Event', 'max'),
+        Frequency=('Events', 'sum'),
+        Monetary=('Revenue', 'sum'),
+    ).reset_index()
+
+    df_RFM['Recency'] = (reference_time - df_RFM.pop('Last_Event')).dt.days.astype(np.int64)
+    df_RFM['Frequency'] = df_RFM['Frequency'].astype(np.int64)
+    df_RFM['Monetary'] = df_RFM['Monetary'].round(MONETARY_DECIMALS)
+
+    df_RFM = score_rfm(df_RFM, quantile_levels)
+    return df_RFM[RFM_COLUMNS]
+
+
+# Funkcja do obliczania RFM: jedno grupowanie z nazwanymi agregacjami i punktacja na tablicach NumPy
+@profiled()
+def compute_rfm(df_original: pd.DataFrame, quantile_levels=QUANTILE_LEVELS) -> pd.DataFrame:
+    reference_time = df_original['event_time'].max()
+
+    df_RFM = df_original.groupby('user_id', sort=True).agg(
+        Last_Event=('event_time', 'max'),
+        Frequency=('event_type', 'count'),
+        Monetary=('price', 'sum'),
+    ).reset_index()
+
+    # Recency liczone od ostatniego zdarzenia klienta (pełne dni, jak w .dt.days)
+    df_RFM['Recency'] = (reference_time - df_RFM.pop('Last_Event')).dt.days.astype(np.int64)
+    df_RFM['Frequency'] = df_RFM['Frequency'].astype(np.int64)
+    df_RFM['Monetary'] = df_RFM['Monetary'].astype(np.float64).round(MONETARY_DECIMALS)
+
+    df_RFM = score_rfm(df_RFM, quantile_levels)
+    return df_RFM[RFM_COLUMNS]
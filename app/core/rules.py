@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+
+class RuleIndex:
+    # Posortowane kopie kolumn filtrowanych suwakami - zakres wartości wyznaczamy wyszukiwaniem
+    # binarnym zamiast porównywać wszystkie reguły przy każdym ruchu suwaka
+
+    def __init__(self, rules: pd.DataFrame, columns: list):
+        self.n_rules = len(rules)
+        self._values = {}
+        self._order = {}
+        self._sorted_values = {}
+        for col in columns:
+            values = rules[col].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind='stable')
+            self._values[col] = values
+            self._order[col] = order
+            self._sorted_values[col] = values[order]
+
+    # Funkcja zwracająca pozycje reguł spełniających wszystkie zakresy (lo <= wartość <= hi)
+    def filter(self, ranges: dict) -> np.ndarray:
+        selections = []
+        for col, (low, high) in ranges.items():
+            sorted_values = self._sorted_values[col]
+            start = np.searchsorted(sorted_values, low, side='left')
+            stop = np.searchsorted(sorted_values, high, side='right')
+            if start == 0 and stop == self.n_rules:
+                continue  # Zakres obejmuje wszystkie reguły
+            selections.append((stop - start, col, start, stop))
+
+        if not selections:
+            return np.arange(self.n_rules)
+
+        # Zaczynamy od najwęższego zakresu, pozostałe sprawdzamy tylko na wybranych regułach
+        selections.sort()
+        _, col, start, stop = selections[0]
+        positions = np.sort(self._order[col][start:stop])
+        for _, col, _, _ in selections[1:]:
+            low, high = ranges[col]
+            values = self._values[col][positions]
+            positions = positions[(values >= low) & (values <= high)]
+        return positions
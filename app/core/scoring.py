@@ -0,0 +1,125 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.core.profiling import profiled
+
+DEFAULT_MODEL_PATH = 'models/model_kmeans_cosmetic_05_org.joblib'
+FEATURE_COLUMNS = ['recency', 'frequency', 'monetary']
+
+# Liczba klientów przypisywanych do klastrów w jednej paczce (ogranicza pamięć tablicy odległości)
+SCORING_CHUNK_SIZE = 250_000
+
+SEGMENT_LABELS = {
+    0: "Champions",
+    1: "Loyal Customers",
+    2: "At Risk",
+    3: "Lost Customers",
+    4: "New Customers"
+}
+
+
+# Funkcja do wczytania modelu KMeans z pliku joblib
+def load_kmeans_model(model_path: str = DEFAULT_MODEL_PATH):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+    import joblib  # Import dopiero przy wczytywaniu modelu
+
+    return joblib.load(model_path)
+
+
+# Funkcja zwracająca kolumny cech niezależnie od wielkości pierwszej litery (Recency / recency)
+def feature_matrix(df: pd.DataFrame, columns=FEATURE_COLUMNS) -> np.ndarray:
+    lookup = {col[0].lower() + col[1:]: col for col in df.columns if isinstance(col, str) and col}
+    missing = [col for col in columns if col not in lookup]
+    if missing:
+        raise KeyError(f"Brak kolumn cech: {missing}")
+    return np.column_stack([df[lookup[col]].to_numpy(dtype=np.float32) for col in columns])
+
+
+# Funkcja przypisująca paczkę punktów do najbliższego centroidu (odległości w float32)
+def _nearest_centroid(chunk: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    distances = np.zeros((len(chunk), len(centers)), dtype=np.float32)
+    for j in range(chunk.shape[1]):
+        distances += np.square(chunk[:, j, None] - centers[None, :, j])
+    return distances.argmin(axis=1).astype(np.int32)
+
+
+# Funkcja rozdzielająca model na przekształcenie cech (np. skaler w potoku) i centroidy
+def _model_parts(model):
+    if hasattr(model, 'steps'):
+        return model[:-1].transform, model.steps[-1][1].cluster_centers_
+    return None, model.cluster_centers_
+
+
+# Funkcja do przypisania etykiet klastrów w paczkach - paczki liczone równolegle w puli wątków
+# (numpy zwalnia GIL w operacjach na tablicach, więc wątki pracują naprawdę równolegle)
+def predict_chunked(model, features: np.ndarray, chunk_size: int = SCORING_CHUNK_SIZE,
+                    n_workers: int = None) -> np.ndarray:
+    transform, centers = _model_parts(model)
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    centers = np.asarray(centers, dtype=np.float32)
+    labels = np.empty(len(features), dtype=np.int32)
+    starts = range(0, len(features), chunk_size)
+
+    def score_chunk(start):
+        stop = min(start + chunk_size, len(features))
+        chunk = features[start:stop]
+        if transform is not None:
+            chunk = transform(chunk).astype(np.float32, copy=False)
+        labels[start:stop] = _nearest_centroid(chunk, centers)
+
+    if n_workers == 1 or len(starts) <= 1:
+        for start in starts:
+            score_chunk(start)
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(score_chunk, starts))
+    return labels
+
+
+# Funkcja do przypisania etykiet klastrów dla wyników RFM
+@profiled()
+def score_rfm(model, df: pd.DataFrame, chunk_size: int = SCORING_CHUNK_SIZE, n_workers: int = None) -> np.ndarray:
+    return predict_chunked(model, feature_matrix(df), chunk_size, n_workers)
+
+
+# Funkcje do odczytu i zapisu pliku RFM (Parquet lub CSV - wg rozszerzenia)
+def read_rfm_file(path: str) -> pd.DataFrame:
+    if path.lower().endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+
+def write_rfm_file(df: pd.DataFrame, path: str) -> None:
+    if path.lower().endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+# Wsadowe przypisanie segmentów z linii poleceń:
+# python -m app.core.scoring wyniki_rfm.csv wyniki_segmenty.parquet
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Przypisanie segmentów KMeans do wyników RFM")
+    parser.add_argument('input', help="Plik RFM (.parquet lub .csv) z kolumnami recency, frequency, monetary")
+    parser.add_argument('output', help="Plik wynikowy (.parquet lub .csv)")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Ścieżka do modelu joblib")
+    parser.add_argument('--chunk-size', type=int, default=SCORING_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help="Liczba wątków (domyślnie wg liczby rdzeni)")
+    args = parser.parse_args(argv)
+
+    model = load_kmeans_model(args.model)
+    df = read_rfm_file(args.input)
+    labels = score_rfm(model, df, args.chunk_size, args.workers)
+    df['Segment'] = labels
+    df['Segment Name'] = pd.Series(labels).map(SEGMENT_LABELS).to_numpy()
+    write_rfm_file(df, args.output)
+    print(f"Zapisano {len(df):,} klientów do {args.output}")
+
+
+if __name__ == '__main__':
+    main()
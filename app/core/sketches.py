@@ -0,0 +1,136 @@
+import numpy as np
+
+# Precyzja HyperLogLog: 2^14 rejestrów, błąd standardowy ok. 1.04 / sqrt(2^14) = 0.8%
+HLL_PRECISION = 14
+
+_MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+# Funkcja mieszająca splitmix64 - równomierny 64-bitowy skrót identyfikatorów całkowitych
+def hash64(values: np.ndarray) -> np.ndarray:
+    x = values.astype(np.uint64, copy=True)
+    with np.errstate(over='ignore'):
+        x += np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# Funkcja zwracająca liczbę bitów potrzebnych do zapisu wartości (dokładnie, bez zaokrągleń float)
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & _MASK_32).astype(np.float64)
+    high_bits = np.frexp(high)[1]
+    low_bits = np.frexp(low)[1]
+    return np.where(high > 0, high_bits + 32, low_bits).astype(np.int64)
+
+
+class HyperLogLog:
+    # Szkic liczby unikalnych wartości - szkice z różnych dni można łączyć (maksimum rejestrów)
+
+    def __init__(self, registers: np.ndarray = None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    @staticmethod
+    def register_updates(values: np.ndarray, precision: int = HLL_PRECISION):
+        # Numer rejestru (górne bity skrótu) i pozycja pierwszej jedynki w pozostałych bitach
+        hashed = hash64(values)
+        index = (hashed >> np.uint64(64 - precision)).astype(np.int64)
+        remaining = hashed & np.uint64((1 << (64 - precision)) - 1)
+        rank = (64 - precision) - _bit_length(remaining) + 1
+        return index, rank.astype(np.uint8)
+
+    def add(self, values: np.ndarray) -> "HyperLogLog":
+        index, rank = self.register_updates(np.asarray(values), self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        return HyperLogLog(np.maximum(self.registers, other.registers), self.precision)
+
+    def count(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            # Korekta dla małych liczności (linear counting)
+            return m * np.log(m / zeros)
+        return float(estimate)
+
+
+# Funkcja do budowy szkiców HLL dla wielu grup naraz (np. jeden szkic na dzień)
+def grouped_hll_registers(group_codes: np.ndarray, n_groups: int, values: np.ndarray,
+                          precision: int = HLL_PRECISION) -> np.ndarray:
+    registers = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    index, rank = HyperLogLog.register_updates(values, precision)
+    np.maximum.at(registers, (group_codes, index), rank)
+    return registers
+
+
+# Funkcja do połączenia szkiców z wybranych grup (np. dni z zakresu dat)
+def merge_hll(registers: np.ndarray, precision: int = HLL_PRECISION) -> HyperLogLog:
+    merged = registers.max(axis=0) if len(registers) else np.zeros(1 << precision, dtype=np.uint8)
+    return HyperLogLog(merged, precision)
+
+
+# Dokładność losowania próbki klientów (udział zaokrąglany do 1/USER_SAMPLE_BUCKETS)
+USER_SAMPLE_BUCKETS = 10_000
+
+
+# Funkcja zaokrąglająca udział klientów w próbce do dokładności losowania (co najmniej jeden przedział)
+def user_sample_fraction(fraction: float) -> float:
+    if fraction >= 1:
+        return 1.0
+    return max(round(fraction * USER_SAMPLE_BUCKETS), 1) / USER_SAMPLE_BUCKETS
+
+
+# Funkcja wybierająca klientów do próbki wg skrótu user_id - klient trafia do próbki ze wszystkimi
+# swoimi zdarzeniami, a ten sam udział daje zawsze tych samych klientów
+def user_sample_mask(user_ids: np.ndarray, fraction: float) -> np.ndarray:
+    buckets = hash64(np.asarray(user_ids).astype(np.int64)) % np.uint64(USER_SAMPLE_BUCKETS)
+    return buckets < np.uint64(round(user_sample_fraction(fraction) * USER_SAMPLE_BUCKETS))
+
+
+# Błąd rangi kwantyli z próbki n wartości (nierówność DKW, poziom ufności 95%)
+def dkw_rank_error(n: int) -> float:
+    return float(np.sqrt(np.log(2 / 0.05) / (2 * n))) if n else 1.0
+
+
+# Funkcja do przybliżonych kwantyli z losowej próbki o stałym rozmiarze
+# Zwraca kwantyle i błąd rangi - 0 gdy użyto wszystkich wartości (fraction < 1: wartości są już próbką klientów)
+def sample_quantiles(values: np.ndarray, levels, sample_size: int = 100_000, seed: int = 0, fraction: float = 1.0):
+    values = np.asarray(values)
+    sampled = fraction < 1 or len(values) > sample_size
+    if len(values) > sample_size:
+        values = np.random.default_rng(seed).choice(values, size=sample_size, replace=False)
+    rank_error = dkw_rank_error(len(values)) if sampled else 0.0
+    return np.quantile(values, levels), rank_error
+
+
+# Funkcja do oszacowania sumy z próbki klientów (estymator Horvitza-Thompsona, każdy klient z prawd. fraction)
+# Zwraca sumę i jej błąd względny (poziom ufności 95%)
+def sample_total(values: np.ndarray, fraction: float = 1.0):
+    values = np.asarray(values, dtype=np.float64)
+    total = values.sum() / fraction
+    if fraction >= 1 or total == 0:
+        return total, 0.0
+    std = np.sqrt((1 - fraction) * np.sum(values ** 2)) / fraction
+    return total, 1.96 * std / abs(total)
+
+
+# Funkcja do oszacowania średniej z próbki klientów - zwraca średnią i jej błąd względny (poziom ufności 95%)
+def sample_mean(values: np.ndarray, fraction: float = 1.0):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0, 0.0
+    mean = values.mean()
+    if fraction >= 1 or len(values) < 2 or mean == 0:
+        return mean, 0.0
+    std = values.std(ddof=1) * np.sqrt((1 - fraction) / len(values))
+    return mean, 1.96 * std / abs(mean)
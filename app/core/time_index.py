@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+
+# Funkcja do jednorazowego posortowania zbioru po event_time (przy wczytywaniu)
+def sort_by_event_time(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty or df['event_time'].is_monotonic_increasing:
+        return df
+    order = np.argsort(df['event_time'].to_numpy(), kind='stable')
+    return df.take(order).reset_index(drop=True)
+
+
+# Funkcja zwracająca pierwszy i ostatni dzień w posortowanym zbiorze
+def date_bounds(df: pd.DataFrame):
+    event_times = df['event_time']
+    return event_times.iloc[0].date(), event_times.iloc[-1].date()
+
+
+# Funkcja do wyboru zakresu dat wyszukiwaniem binarnym - zwraca wycinek bez kopiowania wierszy
+def slice_date_range(df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    event_times = df['event_time'].to_numpy()
+    start = np.searchsorted(event_times, np.datetime64(start_date, 'ns'), side='left')
+    stop = np.searchsorted(event_times, np.datetime64(end_date, 'D') + np.timedelta64(1, 'D'), side='left')
+    return df.iloc[start:stop]
+
+
+# Funkcja do wyboru zakresu dni w agregatach posortowanych po kolumnie 'day'
+def slice_day_range(df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    days = df['day'].to_numpy()
+    start = np.searchsorted(days, np.datetime64(start_date, 'ns'), side='left')
+    stop = np.searchsorted(days, np.datetime64(end_date, 'ns'), side='right')
+    return df.iloc[start:stop]
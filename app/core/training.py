@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from app.core.hopkins import hopkins_statistic
+from app.core.scoring import FEATURE_COLUMNS, feature_matrix
+
+DEFAULT_K_RANGE = range(2, 11)
+
+# Rozmiar paczki MiniBatchKMeans i liczba punktów do liczenia współczynnika silhouette
+MINIBATCH_SIZE = 4096
+SILHOUETTE_SAMPLE_SIZE = 5_000
+
+# sklearn i joblib importujemy w funkcjach - ładują się dopiero przy trenowaniu, a nie przy otwarciu strony
+
+
+# Funkcja do skalowania cech RFM do zakresu [0, 1]
+def scale_features(features: np.ndarray):
+    from sklearn.preprocessing import MinMaxScaler
+
+    scaler = MinMaxScaler()
+    return scaler, scaler.fit_transform(features.astype(np.float64))
+
+
+# Funkcja do dopasowania MiniBatchKMeans i oceny jakości dla jednego k
+# Silhouette i inercję liczymy na próbce - dokładny silhouette ma koszt kwadratowy względem liczby klientów
+def fit_and_score(X: np.ndarray, k: int, random_state: int = 0,
+                  evaluation_sample_size: int = SILHOUETTE_SAMPLE_SIZE) -> dict:
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    model = MiniBatchKMeans(n_clusters=k, batch_size=MINIBATCH_SIZE, n_init=1, random_state=random_state)
+    model.fit(X)
+
+    rng = np.random.default_rng(random_state)
+    sample = X[rng.choice(len(X), min(evaluation_sample_size, len(X)), replace=False)]
+    labels = model.predict(sample)
+    silhouette = silhouette_score(sample, labels) if len(np.unique(labels)) > 1 else -1.0
+    inertia = -model.score(sample) * len(X) / len(sample)  # Inercja przeskalowana do całego zbioru
+    return {'k': k, 'inertia': float(inertia), 'silhouette': float(silhouette), 'model': model}
+
+
+# Funkcja do równoległego dopasowania modeli dla zakresu k (jeden proces na k)
+def evaluate_k_range(X: np.ndarray, k_range=DEFAULT_K_RANGE, n_jobs: int = -1, random_state: int = 0) -> list:
+    from joblib import Parallel, delayed
+
+    return Parallel(n_jobs=n_jobs)(delayed(fit_and_score)(X, k, random_state) for k in k_range)
+
+
+# Pełny proces trenowania: skalowanie, test Hopkinsa, dobór k wg silhouette
+# Zwraca potok (skaler + KMeans) przyjmujący surowe cechy RFM oraz tabelę wyników dla każdego k
+def train_kmeans(df: pd.DataFrame, k_range=DEFAULT_K_RANGE, n_jobs: int = -1, random_state: int = 0):
+    from sklearn.pipeline import Pipeline
+
+    scaler, X = scale_features(feature_matrix(df))
+    hopkins, _ = hopkins_statistic(X, seed=random_state)
+
+    results = evaluate_k_range(X, k_range, n_jobs, random_state)
+    best = max(results, key=lambda result: result['silhouette'])
+    pipeline = Pipeline([('scaler', scaler), ('kmeans', best['model'])])
+
+    scores = pd.DataFrame([{key: value for key, value in result.items() if key != 'model'} for result in results])
+    metadata = {
+        'k': best['k'],
+        'silhouette': best['silhouette'],
+        'inertia': best['inertia'],
+        'hopkins': hopkins,
+        'n_samples': len(X),
+        'features': FEATURE_COLUMNS,
+    }
+    return pipeline, scores, metadata
@@ -0,0 +1,151 @@
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from app.core.dataset_cache import has_artifact, list_cached
+from app.core.dataset_store import get_dataset_artifact
+from app.core.query_backend import ARTIFACT_BUILDERS
+from app.core.result_cache import get_result_cache
+from app.core.scoring import DEFAULT_MODEL_PATH, load_kmeans_model
+
+logger = logging.getLogger(__name__)
+
+# Budżet czasu importów przy starcie (sekundy) - przekroczenie jest zapisywane w logu serwera
+IMPORT_TIME_BUDGET_S = float(os.environ.get("MARKETING_APP_IMPORT_BUDGET_S", 2.0))
+
+# Rozgrzewanie w tle można wyłączyć (MARKETING_APP_WARMUP=0), np. przy małej ilości pamięci
+WARMUP_ENABLED = os.environ.get("MARKETING_APP_WARMUP", "1") != "0"
+
+# Liczba ostatnio wczytanych zbiorów, których tabele pochodne są wczytywane przy starcie
+WARMUP_DATASETS = int(os.environ.get("MARKETING_APP_WARMUP_DATASETS", 1))
+
+# Ciężkie biblioteki importowane dopiero w analizach, które ich potrzebują - rozgrzewanie ładuje je w tle
+HEAVY_MODULES = (
+    "sklearn.cluster",
+    "sklearn.metrics",
+    "sklearn.pipeline",
+    "sklearn.preprocessing",
+    "mlxtend.frequent_patterns",
+    "matplotlib.pyplot",
+    "scipy.spatial",
+    "pyarrow.dataset",
+    "joblib",
+)
+
+# Moduły wczytywane przy otwarciu aplikacji (strona startowa) - ich import liczy się do budżetu
+STARTUP_MODULES = (
+    "streamlit",
+    "app.core.warmup",
+    "app.core.catalog",
+    "app.core.exports",
+)
+
+MODEL_CACHE_SIZE = 4
+
+_lock = threading.Lock()
+_state = {"thread": None, "import_seconds": None, "steps": {}}
+
+
+# Funkcja zwracająca model KMeans wspólny dla wszystkich sesji (ponowne wczytanie tylko po zmianie pliku)
+def get_kmeans_model(model_path: str = DEFAULT_MODEL_PATH):
+    models = get_result_cache('models', MODEL_CACHE_SIZE)
+    key = (model_path, os.path.getmtime(model_path))
+    return models.get_or_compute(key, lambda: load_kmeans_model(model_path))
+
+
+# Funkcja do zapisania czasu importów przy pierwszym uruchomieniu skryptu (ostrzeżenie po przekroczeniu budżetu)
+def check_import_budget(seconds: float, budget: float = IMPORT_TIME_BUDGET_S) -> bool:
+    with _lock:
+        if _state["import_seconds"] is not None:
+            return _state["import_seconds"] <= budget
+        _state["import_seconds"] = seconds
+    if seconds > budget:
+        logger.warning("Import modułów przy starcie trwał %.2f s (budżet %.2f s).", seconds, budget)
+    else:
+        logger.info("Import modułów przy starcie: %.2f s (budżet %.2f s).", seconds, budget)
+    return seconds <= budget
+
+
+def _timed(name: str, step) -> None:
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        # Rozgrzewanie jest tylko optymalizacją - błąd pojawi się ponownie, gdy analiza będzie uruchomiona
+        logger.warning("Rozgrzewanie (%s) nie powiodło się: %s", name, e)
+    _state["steps"][name] = time.perf_counter() - started
+
+
+def _warm_datasets() -> None:
+    for meta in list_cached()[:WARMUP_DATASETS]:
+        for name in ARTIFACT_BUILDERS:
+            # Tylko tabele zapisane na dysku - budowa brakujących wymagałaby wczytania całego zbioru
+            if has_artifact(meta["key"], name):
+                get_dataset_artifact(meta["key"], name)
+
+
+# Rozgrzewanie: import ciężkich bibliotek, wczytanie modelu bazowego i tabel pochodnych ostatnich zbiorów
+def warm_up() -> dict:
+    for module in HEAVY_MODULES:
+        _timed(module, lambda module=module: importlib.import_module(module))
+    if os.path.exists(DEFAULT_MODEL_PATH):
+        _timed("model", lambda: get_kmeans_model(DEFAULT_MODEL_PATH))
+    _timed("datasets", _warm_datasets)
+    logger.info("Rozgrzewanie zakończone w %.2f s.", sum(_state["steps"].values()))
+    return dict(_state["steps"])
+
+
+# Funkcja uruchamiająca rozgrzewanie w wątku w tle - raz na proces serwera
+# Pierwsza sesja nie czeka na wynik; strony korzystające z tych zasobów dostają je z cache
+def start_warmup():
+    if not WARMUP_ENABLED:
+        return None
+    with _lock:
+        if _state["thread"] is not None:
+            return _state["thread"]
+        # Wątek jest wspólny dla procesu, więc nie dostaje kontekstu sesji, która go uruchomiła - pomiary
+        # trafiają tylko do logu, a wątek nie trzyma referencji do sesji po jej zakończeniu
+        thread = threading.Thread(target=warm_up, name="marketing-app-warmup", daemon=True)
+        _state["thread"] = thread
+    thread.start()
+    return thread
+
+
+# Pomiar czasu importu modułów w nowym procesie - kolejne moduły w tej samej kolejności co przy starcie,
+# więc czas każdego z nich nie obejmuje wspólnych zależności zaimportowanych wcześniej
+def measure_imports(modules) -> dict:
+    code = (
+        "import importlib, sys, time\n"
+        "for name in sys.argv[1:]:\n"
+        "    t = time.perf_counter(); importlib.import_module(name); print(name, time.perf_counter() - t)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code, *modules], capture_output=True, text=True, check=True)
+    return {name: float(seconds) for name, seconds in (line.split() for line in result.stdout.splitlines())}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pomiar czasu importu modułów przy starcie aplikacji.")
+    parser.add_argument('--budget', type=float, default=IMPORT_TIME_BUDGET_S, help="Budżet czasu (s)")
+    parser.add_argument('--heavy', action='store_true', help="Zmierz także biblioteki importowane leniwie")
+    args = parser.parse_args(argv)
+
+    startup = measure_imports(STARTUP_MODULES)
+    for module, seconds in startup.items():
+        print(f"{module:<28} {seconds:6.2f} s")
+    total = sum(startup.values())
+    print(f"{'start aplikacji':<28} {total:6.2f} s (budżet {args.budget:.2f} s)")
+
+    if args.heavy:
+        for module, seconds in measure_imports(STARTUP_MODULES + HEAVY_MODULES).items():
+            if module in HEAVY_MODULES:
+                print(f"{module:<28} {seconds:6.2f} s (przy pierwszym użyciu)")
+    return 0 if total <= args.budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,36 @@
 import streamlit as st
-import joblib
-import matplotlib.pyplot as plt
 import plotly.express as px
 import os
-import pandas as pd
+
+from app.core.dataset_store import get_session_backend
+from app.core.exports import export_button
+from app.core.hopkins import describe_hopkins, hopkins_statistic, scale_to_unit_range
+from app.core.model_registry import list_models, register_model
+from app.core.profiling import cached_stage
+from app.core.render import DEFAULT_POINT_BUDGET, stratified_sample
+from app.core.result_cache import get_result_cache
+from app.core.scoring import DEFAULT_MODEL_PATH, SEGMENT_LABELS, feature_matrix, score_rfm
+from app.core.training import DEFAULT_K_RANGE, train_kmeans
+from app.core.warmup import get_kmeans_model
+
+# Liczba zapamiętanych wyników przypisania do klastrów (wspólna dla wszystkich sesji)
+LABELS_CACHE_SIZE = 16
 
 st.title("🔢 Klasteryzacja KMeans")
 
-# Funkcja do ładowania modelu
-@st.cache_resource
+# Funkcja do ładowania modelu (wspólny dla sesji; model bazowy jest wczytywany w tle przy starcie serwera)
 def load_model(model_path):
     try:
-        loaded_model = joblib.load(model_path)
-        return loaded_model
+        return get_kmeans_model(model_path)
     except Exception as e:
         st.error(f"Nie udało się załadować modelu: {e}")
         return None
 
+# Funkcja do informacji o próbkowaniu punktów na wykresie
+def show_sampling_note(plot_data, data):
+    if len(plot_data) < len(data):
+        st.caption(f"Wyświetlono {len(plot_data):,} z {len(data):,} klientów (próbka warstwowa wg segmentu).")
+
 # Funkcje do wizualizacji
 def visualize_clusters_2d_interactive(data, labels, color_map, segment_labels):
     try:
@@ -32,20 +46,23 @@ def visualize_clusters_2d_interactive(data, labels, color_map, segment_labels):
 
         filtered_data = data[data['Segment Name'].isin(selected_segments)]
 
-        # Wykres 2D
+        # Próbka warstwowa wg segmentu - liczba rysowanych punktów nie zależy od wielkości zbioru
+        plot_data = stratified_sample(filtered_data, 'Segment Name', point_budget)
+        show_sampling_note(plot_data, filtered_data)
+
+        # Wykres 2D (jedna seria na segment, aby legenda odpowiadała kolorom)
+        import matplotlib.pyplot as plt  # Import dopiero przy rysowaniu - nie spowalnia startu aplikacji
+
         fig, ax = plt.subplots(figsize=(10, 6))
-        scatter = ax.scatter(
-            filtered_data['recency'],
-            filtered_data['frequency'],
-            c=filtered_data['Segment Name'].map(color_map),
-            alpha=0.7
-        )
-        legend1 = ax.legend(
-            handles=scatter.legend_elements()[0],
-            labels=selected_segments,
-            title="Segment"
-        )
-        ax.add_artist(legend1)
+        for segment_name, segment_data in plot_data.groupby('Segment Name'):
+            ax.scatter(
+                segment_data['recency'],
+                segment_data['frequency'],
+                c=color_map.get(segment_name, "gray"),
+                label=segment_name,
+                alpha=0.7
+            )
+        ax.legend(title="Segment")
         ax.set_xlabel("Recency")
         ax.set_ylabel("Frequency")
         ax.set_title("Wizualizacja klastrów (2D)")
@@ -63,6 +80,11 @@ def visualize_clusters_3d_dynamic(data, labels, color_map, segment_labels):
             options=["Wszystkie"] + list(segment_labels.values())
         )
 
+        # Próbka warstwowa wg segmentu - do przeglądarki trafia ograniczona liczba punktów
+        full_data = data
+        data = stratified_sample(data, 'Segment Name', point_budget).copy()
+        show_sampling_note(data, full_data)
+
         if highlight_segment != "Wszystkie":
             data['Highlight'] = data['Segment Name'].apply(
                 lambda x: highlight_segment if x == highlight_segment else "Inne"
@@ -123,13 +145,8 @@ def summarize_clusters(data, labels_series, segment_labels):
         if not detailed_data.empty:
             st.write(f"Klienci w segmencie **{selected_cluster}**:")
             st.dataframe(detailed_data[['recency', 'frequency', 'monetary']])
-            csv = detailed_data.to_csv(index=False)
-            st.download_button(
-                label=f"Pobierz dane segmentu {selected_cluster}",
-                data=csv,
-                file_name=f"segment_{selected_cluster}.csv",
-                mime='text/csv'
-            )
+            export_button(f"Pobierz dane segmentu {selected_cluster}", detailed_data,
+                          f"segment_{selected_cluster}", key='export_segment')
         else:
             st.info(f"Brak klientów w segmencie **{selected_cluster}**.")
 
@@ -139,6 +156,10 @@ def summarize_clusters(data, labels_series, segment_labels):
         return None
 
 # Główna logika aplikacji
+if get_session_backend() is None:
+    st.warning("🚫 Proszę wgrać plik CSV na stronie głównej.")
+    st.stop()
+
 if "df_kmeans" not in st.session_state:
     st.warning("🚫 Brak danych do klasteryzacji KMeans.")
     st.stop()
@@ -150,7 +171,60 @@ if not all(col in df_kmeans.columns for col in required_columns):
     st.error("Dane nie zawierają wymaganych kolumn.")
     st.stop()
 
-model_path = 'models/model_kmeans_cosmetic_05_org.joblib'
+# Wstępna ocena skłonności danych do tworzenia skupisk (na cechach przeskalowanych do [0, 1])
+def compute_hopkins(data):
+    return hopkins_statistic(scale_to_unit_range(feature_matrix(data)))
+
+rfm_result_key = st.session_state.get("rfm_result_key")
+if rfm_result_key is not None:
+    hopkins_cache = get_result_cache('hopkins', LABELS_CACHE_SIZE)
+    hopkins, hopkins_std = hopkins_cache.get_or_compute(rfm_result_key, lambda: compute_hopkins(df_kmeans))
+else:
+    hopkins, hopkins_std = compute_hopkins(df_kmeans)
+
+st.subheader("🔎 Test skupiskowości (statystyka Hopkinsa)")
+st.metric("Statystyka Hopkinsa", f"{hopkins:.3f}", help=f"Odchylenie standardowe z prób: {hopkins_std:.3f}")
+st.write(describe_hopkins(hopkins))
+
+# Trenowanie nowego modelu na bieżących wynikach RFM (zapisywany jako kolejna wersja w rejestrze)
+with st.expander("🧪 Trenowanie modelu KMeans", expanded=False):
+    k_min, k_max = st.slider(
+        "Zakres liczby klastrów (k):",
+        min_value=2,
+        max_value=15,
+        value=(DEFAULT_K_RANGE.start, DEFAULT_K_RANGE.stop - 1)
+    )
+    if st.button("🚀 Wytrenuj model"):
+        with st.spinner("Trenowanie modeli dla kolejnych k..."):
+            pipeline, k_scores, metadata = train_kmeans(df_kmeans, range(k_min, k_max + 1))
+            metadata['rfm_result_key'] = st.session_state.get("rfm_result_key")
+            version = register_model(pipeline, metadata)
+        st.session_state['kmeans_model_version'] = version
+        st.session_state['kmeans_training'] = (k_scores, metadata)
+        st.success(f"Zapisano model w wersji v{version} (k={metadata['k']}).")
+
+    if 'kmeans_training' in st.session_state:
+        k_scores, metadata = st.session_state['kmeans_training']
+        st.write(f"Statystyka Hopkinsa: **{metadata['hopkins']:.3f}** - {describe_hopkins(metadata['hopkins'])}")
+        st.dataframe(k_scores)
+        st.plotly_chart(px.line(k_scores, x='k', y='silhouette', markers=True,
+                                title="Silhouette (próbka) dla kolejnych k"))
+
+# Wybór modelu: model bazowy lub jedna z wersji wytrenowanych w aplikacji
+model_options = {"Model bazowy (cosmetic)": None}
+for model_meta in list_models():
+    label = f"v{model_meta['version']} (k={model_meta['k']}, silhouette={model_meta['silhouette']:.3f})"
+    model_options[label] = model_meta
+option_labels = list(model_options)
+selected_version = st.session_state.get('kmeans_model_version')
+default_index = next(
+    (i for i, label in enumerate(option_labels)
+     if model_options[label] is not None and model_options[label]['version'] == selected_version),
+    0
+)
+selected_model = model_options[st.sidebar.selectbox("🤖 Model KMeans:", option_labels, index=default_index)]
+
+model_path = DEFAULT_MODEL_PATH if selected_model is None else selected_model['path']
 if not os.path.exists(model_path):
     raise FileNotFoundError(f"Model file not found at {model_path}")
 
@@ -159,25 +233,30 @@ if loaded_model is None:
     st.stop()
 
 try:
-    features = df_kmeans[required_columns]
-    labels = loaded_model.predict(features)
-    labels_series = pd.Series(labels, name="Segment")
-    df_kmeans['Segment'] = labels_series
-
-    segment_labels = {
-        0: "Champions",
-        1: "Loyal Customers",
-        2: "At Risk",
-        3: "Lost Customers",
-        4: "New Customers"
-    }
-    color_map = {
-        "Champions": "green",
-        "Loyal Customers": "blue",
-        "At Risk": "orange",
-        "Lost Customers": "red",
-        "New Customers": "purple"
-    }
+    # Etykiety liczone raz dla danego wyniku RFM i modelu - suwaki i filtry ich nie przeliczają
+    if rfm_result_key is not None:
+        labels_cache = get_result_cache('kmeans_labels', LABELS_CACHE_SIZE)
+        labels_key = (rfm_result_key, model_path, os.path.getmtime(model_path))
+        labels = cached_stage('kmeans_labels', labels_cache, labels_key,
+                              lambda: score_rfm(loaded_model, df_kmeans), len(df_kmeans))
+    else:
+        labels = score_rfm(loaded_model, df_kmeans)
+    df_kmeans['Segment'] = labels
+
+    if selected_model is None:
+        segment_labels = SEGMENT_LABELS
+        color_map = {
+            "Champions": "green",
+            "Loyal Customers": "blue",
+            "At Risk": "orange",
+            "Lost Customers": "red",
+            "New Customers": "purple"
+        }
+    else:
+        # Modele wytrenowane w aplikacji mają klastry numerowane - kolory z palety plotly
+        palette = px.colors.qualitative.Plotly
+        segment_labels = {i: f"Klaster {i}" for i in range(selected_model['k'])}
+        color_map = {name: palette[i % len(palette)] for i, name in segment_labels.items()}
 
     # Dodanie filtrów na pasku bocznym
     st.sidebar.header("🔍 Filtry danych")
@@ -213,6 +292,18 @@ try:
         (df_kmeans['monetary'] >= monetary_range[0]) & (df_kmeans['monetary'] <= monetary_range[1])
     ]
 
+    # Limit punktów na wykresach (większe zbiory są próbkowane)
+    point_budget = st.sidebar.number_input(
+        "Maksymalna liczba punktów na wykresach:",
+        min_value=1_000,
+        max_value=200_000,
+        value=DEFAULT_POINT_BUDGET,
+        step=1_000
+    )
+
+    # Etykiety przefiltrowanych klientów (wyrównane z filtered_data po indeksie)
+    labels_series = filtered_data['Segment']
+
     # Wizualizacje
     st.subheader("Wizualizacja klastrów (2D - interaktywna)")
     visualize_clusters_2d_interactive(filtered_data, labels_series, color_map, segment_labels)
@@ -1,33 +1,38 @@
 import streamlit as st
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from mlxtend.frequent_patterns import apriori, association_rules
+
+from app.core.basket import BASKET_MODES, create_basket_matrix
+from app.core.dataset_store import get_session_backend
+from app.core.exports import export_button
+from app.core.itemsets import mine_frequent_itemsets
+from app.core.profiling import cached_stage, profiled
+from app.core.result_cache import get_result_cache
+from app.core.rules import RuleIndex
+
+# Liczba zapamiętanych wyników wyszukiwania częstych zbiorów (wspólna dla wszystkich sesji)
+ITEMSETS_CACHE_SIZE = 8
+
+# Liczba reguł wyświetlanych na jednej stronie tabeli
+RULES_PAGE_SIZE = 500
 
 
 # Tytuł strony
 st.title("📊 Analiza Koszykowa")
 
 # Sprawdzenie, czy plik został wgrany
-if 'df_sales' not in st.session_state:
+backend = get_session_backend()
+if backend is None:
     st.warning("🚫 Proszę wgrać plik CSV na stronie głównej.")
     st.stop()
 
-df_sales = st.session_state['df_sales']
-
-
-# Funkcja do tworzenia gęstej macierzy
-def create_dense_matrix(data, column):
-    grouped_data = data.groupby('user_id')[column].apply(lambda x: ' '.join(map(str, x.unique())))
-    vectorizer = CountVectorizer(binary=True, dtype=bool)
-    sparse_matrix = vectorizer.fit_transform(grouped_data.astype(str))
-    return pd.DataFrame(sparse_matrix.toarray(), columns=vectorizer.get_feature_names_out())
-
 
-# Funkcja do generowania reguł asocjacyjnych
-def generate_association_rules(data_df, min_support, min_confidence):
-    frequent_itemsets = apriori(data_df, min_support=min_support, use_colnames=True)
+# Funkcja do generowania reguł asocjacyjnych z (zapamiętanych) częstych zbiorów
+@profiled()
+def generate_association_rules(frequent_itemsets, min_confidence):
     if frequent_itemsets.empty:
         return pd.DataFrame()  # Zwróć pustą ramkę danych, jeśli brak wyników
+    from mlxtend.frequent_patterns import association_rules  # Import dopiero przy pierwszym generowaniu reguł
+
     rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
     rules['antecedents'] = rules['antecedents'].apply(lambda x: ', '.join(list(x)))
     rules['consequents'] = rules['consequents'].apply(lambda x: ', '.join(list(x)))
@@ -62,6 +67,16 @@ def rename_and_scale_columns(rules):
     return rules
 
 
+# Kolumny filtrowane suwakami (klucz filtra -> kolumna wyników)
+FILTER_COLUMNS = {
+    "antecedent_support": "Popularność produktów bazowych",
+    "consequent_support": "Popularność produktów rekomendowanych",
+    "support": "Wsparcie reguły",
+    "confidence": "Pewność reguły",
+    "lift": "Wzrost sprzedaży",
+}
+
+
 # Funkcja do formatowania kolumn procentowych
 def format_percent(df, columns):
     df_formatted = df.copy()
@@ -112,6 +127,40 @@ analysis_type = st.selectbox(
     ("Produkty", "Marki", "Kategorie")
 )
 
+# Wybór definicji koszyka
+BASKET_MODE_OPTIONS = {
+    "Cała historia użytkownika": "user",
+    "Sesja użytkownika (user_session)": "session",
+    "Użytkownik w oknie N dni": "window",
+}
+basket_mode_label = st.radio("🧺 Definicja koszyka:", list(BASKET_MODE_OPTIONS.keys()), horizontal=True)
+basket_mode = BASKET_MODE_OPTIONS[basket_mode_label]
+window_days = 7
+if basket_mode == "window":
+    window_days = st.number_input("📅 Długość okna (dni):", min_value=1, max_value=365, value=7, step=1)
+
+# Wybór silnika wyszukiwania częstych zbiorów
+MINING_ENGINE_OPTIONS = {
+    "FP-Growth": "fpgrowth",
+    "Eclat (bitmapy)": "eclat",
+    "Apriori": "apriori",
+}
+mining_engine = st.selectbox("⚙️ Wybierz algorytm:", list(MINING_ENGINE_OPTIONS.keys()))
+
+# Maksymalna liczba elementów w zbiorze (ogranicza eksplozję kombinacji dla dużych katalogów)
+max_itemset_len = st.selectbox(
+    "🔢 Maksymalna liczba elementów w regule:",
+    [None, 2, 3, 4, 5],
+    format_func=lambda value: "Bez limitu" if value is None else str(value)
+)
+
+# Progi wsparcia i pewności reguł
+col_support, col_confidence = st.columns(2)
+with col_support:
+    min_support_percent = st.number_input("📏 Minimalne wsparcie reguły (%):", min_value=0.01, max_value=100.0, value=0.2, step=0.05)
+with col_confidence:
+    min_confidence_percent = st.number_input("🎯 Minimalna pewność reguły (%):", min_value=0.0, max_value=100.0, value=1.0, step=0.5)
+
 # Przycisk do uruchomienia analizy
 if st.button("🔍 Przeprowadź analizę koszykową"):
     # Dopasowanie danych do wyboru użytkownika
@@ -123,24 +172,41 @@ if st.button("🔍 Przeprowadź analizę koszykową"):
 
     selected_column = column_mapping_analysis.get(analysis_type)
 
-    if selected_column in df_sales.columns:
-        analysis_data = df_sales[df_sales['event_type'] == 'purchase'][['user_id', selected_column]].dropna()
-        analysis_data[selected_column] = analysis_data[selected_column].astype(str)
-        dense_matrix = create_dense_matrix(analysis_data, selected_column)
+    basket_columns = BASKET_MODES[basket_mode]
+    missing_columns = [col for col in basket_columns + [selected_column] if col not in backend.columns]
+
+    if not missing_columns:
+        def find_frequent_itemsets():
+            # Tylko zakupy i potrzebne kolumny (przy zbiorach poza pamięcią filtruje je DuckDB)
+            analysis_data = backend.events(columns=basket_columns + [selected_column], event_type='purchase').dropna()
+            # Rzadka macierz koszyków budowana bezpośrednio z zakodowanych par (koszyk, produkt)
+            basket_matrix, item_labels = create_basket_matrix(analysis_data, selected_column, basket_mode, window_days)
+            return mine_frequent_itemsets(
+                basket_matrix, item_labels, min_support_percent / 100,
+                max_len=max_itemset_len, engine=MINING_ENGINE_OPTIONS[mining_engine]
+            )
+
+        # Częste zbiory są zapamiętywane - zmiana progu pewności wymaga tylko ponownego wyznaczenia reguł
+        itemsets_cache = get_result_cache('itemsets', ITEMSETS_CACHE_SIZE)
+        cache_key = (st.session_state['dataset_key'], basket_mode, window_days, selected_column,
+                     min_support_percent, max_itemset_len, MINING_ENGINE_OPTIONS[mining_engine])
+        frequent_itemsets = cached_stage('itemsets', itemsets_cache, cache_key, find_frequent_itemsets)
 
         # Generowanie reguł asocjacyjnych
-        association_rules_result = generate_association_rules(dense_matrix, min_support=0.002, min_confidence=0.01)
-        # association_rules_result = generate_association_rules(dense_matrix, min_support=0.0001, min_confidence=0.0001)
+        association_rules_result = generate_association_rules(frequent_itemsets, min_confidence=min_confidence_percent / 100)
 
         if not association_rules_result.empty:
             # Zmiana nazw kolumn i skalowanie
             association_rules_result = rename_and_scale_columns(association_rules_result)
 
-            # Przechowanie wyników w session_state
+            # Przechowanie wyników w session_state razem z posortowanym indeksem do filtrowania
             st.session_state['association_rules_result'] = association_rules_result
+            st.session_state['association_rules_index'] = RuleIndex(association_rules_result, list(FILTER_COLUMNS.values()))
             st.session_state['analysis_done_koszykowa'] = True
 
-            # Inicjalizacja filtrów
+            # Inicjalizacja filtrów dla nowych wyników
+            st.session_state.pop('default_filters', None)
+            st.session_state.pop('current_filters', None)
             initialize_filters(association_rules_result)
 
             st.success("✅ Analiza koszykowa została przeprowadzona pomyślnie!")
@@ -149,7 +215,7 @@ if st.button("🔍 Przeprowadź analizę koszykową"):
             st.session_state['association_rules_result'] = None
             st.session_state['analysis_done_koszykowa'] = False
     else:
-        st.error(f"❌ Plik nie zawiera wymaganej kolumny: '{selected_column}'.")
+        st.error(f"❌ Plik nie zawiera wymaganej kolumny: '{missing_columns[0]}'.")
         st.session_state['association_rules_result'] = None
         st.session_state['analysis_done_koszykowa'] = False
 
@@ -251,42 +317,29 @@ if 'analysis_done_koszykowa' in st.session_state and st.session_state['analysis_
         # Przycisk do resetowania filtrów do domyślnych wartości
         st.sidebar.button("🔄 Przywróć domyślne filtry", on_click=reset_filters)
 
-        # Filtracja danych na podstawie suwaków
-        filtered_rules = association_rules_result[
-            (association_rules_result["Popularność produktów bazowych"] >= antecedent_support_range[0]) &
-            (association_rules_result["Popularność produktów bazowych"] <= antecedent_support_range[1]) &
-            (association_rules_result["Popularność produktów rekomendowanych"] >= consequent_support_range[0]) &
-            (association_rules_result["Popularność produktów rekomendowanych"] <= consequent_support_range[1]) &
-            (association_rules_result["Wsparcie reguły"] >= support_range[0]) &
-            (association_rules_result["Wsparcie reguły"] <= support_range[1]) &
-            (association_rules_result["Pewność reguły"] >= confidence_range[0]) &
-            (association_rules_result["Pewność reguły"] <= confidence_range[1]) &
-            (association_rules_result["Wzrost sprzedaży"] >= lift_range[0]) &
-            (association_rules_result["Wzrost sprzedaży"] <= lift_range[1])
-        ]
-
-        # Opcjonalne formatowanie kolumn procentowych z znakiem %
-        filtered_rules_display = format_percent(filtered_rules, [
+        # Filtracja danych na podstawie suwaków - wyszukiwanie binarne w posortowanych kolumnach
+        rule_index = st.session_state['association_rules_index']
+        filtered_positions = rule_index.filter({
+            FILTER_COLUMNS[name]: value_range for name, value_range in st.session_state['current_filters'].items()
+        })
+        filtered_rules = association_rules_result.iloc[filtered_positions]
+
+        # Formatowanie kolumn procentowych tylko dla widocznej strony tabeli
+        n_pages = max(1, -(-len(filtered_rules) // RULES_PAGE_SIZE))
+        page_number = st.number_input(f"📄 Strona wyników (1-{n_pages}):", min_value=1, max_value=n_pages, value=1, step=1)
+        page_rules = filtered_rules.iloc[(page_number - 1) * RULES_PAGE_SIZE:page_number * RULES_PAGE_SIZE]
+        filtered_rules_display = format_percent(page_rules, [
             "Popularność produktów bazowych",
             "Popularność produktów rekomendowanych",
             "Wsparcie reguły",
             "Pewność reguły"
         ])
 
-        st.write("### 📈 Wyniki analizy koszykowej (po filtracji):")
+        st.write(f"### 📈 Wyniki analizy koszykowej (po filtracji): {len(filtered_rules):,} reguł")
         st.dataframe(filtered_rules_display[selected_columns])
 
-        # Dodanie przycisku do pobrania filtrowanych danych
-        # Pobieramy dane z wybranymi kolumnami
-        filtered_selected = filtered_rules[selected_columns]
-        csv = filtered_selected.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')  # Dodanie BOM
-
-        st.download_button(
-            label="📥 Pobierz dane jako CSV",
-            data=csv,
-            file_name='filtered_rules.csv',
-            mime='text/csv'
-        )
+        # Dodanie przycisku do pobrania filtrowanych danych (z wybranymi kolumnami, generowane po kliknięciu)
+        export_button("📥 Pobierz dane", filtered_rules[selected_columns], 'filtered_rules', key='export_rules')
 
 
 
@@ -1,9 +1,22 @@
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.express as px
 import re
 from datetime import datetime
 
+from app.core.cube import cube_metrics, hourly_revenue, monthly_revenue, weekday_revenue
+from app.core.dataset_store import get_dataset_artifact, get_session_backend
+from app.core.exports import export_button
+from app.core.render import histogram_counts
+from app.core.sketches import sample_mean, sample_quantiles, sample_total, user_sample_fraction
+from app.core.time_index import slice_day_range
+
+# Od tej liczby zdarzeń tryb szybki (wartości przybliżone) jest domyślnie włączony
+FAST_MODE_ROWS = 5_000_000
+
+# W trybie szybkim LTV liczymy dla próbki klientów o mniej więcej takiej liczebności
+LTV_SAMPLE_USERS = 200_000
+
 # Funkcja do usuwania emotikonów
 def remove_emoji(text):
     emoji_pattern = re.compile(
@@ -15,41 +28,35 @@ def remove_emoji(text):
         "]+", flags=re.UNICODE)
     return emoji_pattern.sub(r'', text)
 
-# Funkcja do obliczania LTV na użytkownika
-def calculate_ltv(df):
-    # Zakładamy, że LTV = suma zakupów / liczba dni od pierwszego zakupu
-    df['First_Purchase'] = df.groupby('user_id')['event_time'].transform('min')
-    df['Days_Since_First_Purchase'] = (df['event_time'] - df['First_Purchase']).dt.days
-    df['Days_Since_First_Purchase'] = df['Days_Since_First_Purchase'].replace(0, 1)  # Unikamy dzielenia przez zero
-    df['LTV'] = df['price'] / df['Days_Since_First_Purchase']
-    ltv_df = df.groupby('user_id').agg(
-        Total_Revenue=('price', 'sum'),
-        Total_Days=('Days_Since_First_Purchase', 'max'),
-        LTV=('LTV', 'sum')
-    ).reset_index()
-    return ltv_df
+# Opis dokładności metryki wyświetlany przy st.metric
+def error_help(method, error):
+    if not error:
+        return "Wartość dokładna"
+    return f"Wartość przybliżona ({method}), błąd ±{error:.1%} (poziom ufności 95%)"
+
+# Funkcja przypisująca segmenty LTV na całej kolumnie naraz (bez apply po wierszach)
+def ltv_segments(ltv_values, low_threshold, high_threshold):
+    return np.select(
+        [ltv_values >= high_threshold, ltv_values >= low_threshold],
+        ['💎 High LTV', '💰 Medium LTV'],
+        default='📉 Low LTV'
+    )
 
 # Konfiguracja strony
 st.set_page_config(page_title="📊 Dashboard - Analiza Danych", layout="wide")
 st.title("📈 Dashboard - Analiza Danych")
 
 # Sprawdzenie, czy plik został wgrany
-if 'df_sales' not in st.session_state:
+# Duże zbiory są przetwarzane poza pamięcią (DuckDB na plikach Parquet), pozostałe w pandas
+backend = get_session_backend()
+if backend is None:
     st.warning("🚫 Proszę wgrać plik CSV na stronie głównej.")
     st.stop()
-
-df_sales = st.session_state['df_sales']
-
-try:
-    # Konwersja event_time na datetime
-    df_sales['event_time'] = pd.to_datetime(df_sales['event_time'])
-except Exception as e:
-    st.error(f"❌ Nie udało się przetworzyć kolumny 'event_time': {e}")
-    st.stop()
+if backend.name == "duckdb":
+    st.caption("🗄️ Duży zbiór danych - obliczenia wykonywane poza pamięcią (DuckDB).")
 
 # Wybór zakresu dat
-min_date = df_sales['event_time'].min().date()
-max_date = df_sales['event_time'].max().date()
+min_date, max_date = backend.date_bounds()
 
 start_date, end_date = st.date_input(
     "📅 Wybierz zakres dat",
@@ -58,21 +65,44 @@ start_date, end_date = st.date_input(
     max_value=max_date
 )
 
+# Tryb szybki: unikalni użytkownicy ze szkiców (HyperLogLog), a LTV z próbki klientów zamiast pełnych przebiegów
+fast_mode = st.toggle(
+    "⚡ Tryb szybki (wartości przybliżone)",
+    value=backend.row_count() > FAST_MODE_ROWS,
+    help="Liczba unikalnych użytkowników jest szacowana, a LTV liczone dla próbki klientów - "
+         "przy każdej metryce podany jest błąd."
+)
+
 if start_date > end_date:
     st.error("❗ Data początkowa nie może być późniejsza niż data końcowa.")
 else:
-    # Filtrowanie danych po zakresie dat
-    filtered_df = df_sales[(df_sales['event_time'].dt.date >= start_date) &
-                           (df_sales['event_time'].dt.date <= end_date)]
+    # Wycinek kostki (dzień x godzina x typ zdarzenia) zbudowanej raz dla zbioru - zamiast filtrowania zdarzeń
+    dataset_key = st.session_state['dataset_key']
+    revenue_cube = slice_day_range(get_dataset_artifact(dataset_key, 'revenue_cube'), start_date, end_date)
 
-    if filtered_df.empty:
+    if revenue_cube.empty:
         st.warning("⚠️ Brak danych dla wybranego zakresu dat.")
     else:
-        # Obliczenia podstawowych metryk
-        total_transactions = filtered_df.shape[0]
-        total_revenue = filtered_df['price'].sum()
-        average_transaction_value = filtered_df['price'].mean()
-        unique_users = filtered_df['user_id'].nunique()
+        # Obliczenia podstawowych metryk z kostki
+        daily_users = slice_day_range(get_dataset_artifact(dataset_key, 'users_hll'), start_date, end_date)
+        metrics = cube_metrics(revenue_cube, daily_users)
+
+        total_transactions = metrics['total_transactions']
+        total_revenue = metrics['total_revenue']
+        average_transaction_value = metrics['average_transaction_value']
+        if fast_mode:
+            # Liczba unikalnych użytkowników z połączonych dziennych szkiców HyperLogLog
+            unique_users = metrics['unique_users']
+            unique_users_error = metrics['unique_users_error']
+            unique_users_help = f"Wartość przybliżona (HyperLogLog), błąd standardowy ±{unique_users_error:.1%}"
+        else:
+            # Dokładna liczba z dziennego agregatu (user_id, dzień) - mniej wierszy niż surowe zdarzenia
+            user_daily = slice_day_range(get_dataset_artifact(dataset_key, 'user_daily'), start_date, end_date)
+            unique_users = user_daily['user_id'].nunique()
+            unique_users_error = 0.0
+            unique_users_help = "Wartość dokładna"
+        # Metryki na użytkownika dziedziczą błąd liczby użytkowników
+        per_user_help = unique_users_help if fast_mode else "Wartość dokładna"
         average_transactions_per_user = total_transactions / unique_users if unique_users else 0
         ltv = total_revenue / unique_users if unique_users else 0
 
@@ -80,58 +110,43 @@ else:
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.metric("📦 Całkowita liczba transakcji", f"${total_transactions:,.2f}")
+            st.metric("📦 Całkowita liczba transakcji", f"${total_transactions:,.2f}", help="Wartość dokładna")
             st.divider()
-            st.metric("🛒 Średnia liczba zakupów na użytkownika", f"{average_transactions_per_user:.2f}")
+            st.metric("🛒 Średnia liczba zakupów na użytkownika", f"{average_transactions_per_user:.2f}",
+                      help=per_user_help)
 
         with col2:
-            st.metric("💰 Całkowita wartość transakcji", f"${total_revenue:,.2f}")
+            st.metric("💰 Całkowita wartość transakcji", f"${total_revenue:,.2f}", help="Wartość dokładna")
             st.divider()
-            st.metric("🔄 Customer Lifetime Value (LTV)", f"${ltv:,.2f}")
+            st.metric("🔄 Customer Lifetime Value (LTV)", f"${ltv:,.2f}", help=per_user_help)
 
         with col3:
-            st.metric("💵 Średnia wartość jednej transakcji", f"${average_transaction_value:,.2f}")
+            st.metric("💵 Średnia wartość jednej transakcji", f"${average_transaction_value:,.2f}",
+                      help="Wartość dokładna")
             st.divider()
             formatted_number= " ".join([str(unique_users)[::-1][i:i+3] for i in range(0,len(str(unique_users)), 3)])[::-1]
-            st.metric("👥 Liczba unikalnych użytkowników", formatted_number) 
+            st.metric("👥 Liczba unikalnych użytkowników", formatted_number, help=unique_users_help)
 
-        # Analiza zakupów wg godzin, dni tygodnia i miesięcy
-        cart_data = filtered_df[filtered_df['event_type'] == 'purchase']
+        # Analiza zakupów wg godzin, dni tygodnia i miesięcy (sumy z kostki zamiast przeliczania zdarzeń)
+        cart_data = revenue_cube[revenue_cube['event_type'] == 'purchase']
 
         if not cart_data.empty:
-            cart_data['hour'] = cart_data['event_time'].dt.hour
-            cart_data['day_of_week'] = cart_data['event_time'].dt.day_name()
-            cart_data['month'] = cart_data['event_time'].dt.month_name()
-
-            # Sortowanie dni tygodnia
-            day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-            cart_data['day_of_week'] = pd.Categorical(cart_data['day_of_week'], categories=day_order, ordered=True)
-
-            # Sortowanie miesięcy chronologicznie
-            month_order = ["January", "February", "March", "April", "May", "June",
-                           "July", "August", "September", "October", "November", "December"]
-            cart_data['month'] = pd.Categorical(cart_data['month'], categories=month_order, ordered=True)
-            cart_data = cart_data.sort_values('month')
-
             # Suma wartości zakupów wg godzin (Plotly)
-            hourly_revenue = cart_data.groupby('hour')['price'].sum().reset_index()
-            fig_hourly = px.bar(hourly_revenue, x='hour', y='price',
+            fig_hourly = px.bar(hourly_revenue(cart_data), x='hour', y='price',
                                 labels={'hour': 'Godzina', 'price': 'Suma wartości zakupów'},
                                 title="⏰ Suma wartości zakupów wg godzin",
                                 color_discrete_sequence=["#636EFA"])
             st.plotly_chart(fig_hourly)
 
             # Suma wartości zakupów wg dni tygodnia (Plotly)
-            daily_revenue = cart_data.groupby('day_of_week')['price'].sum().reset_index()
-            fig_daily = px.bar(daily_revenue, x='day_of_week', y='price',
+            fig_daily = px.bar(weekday_revenue(cart_data), x='day_of_week', y='price',
                                labels={'day_of_week': 'Dzień tygodnia', 'price': 'Suma wartości zakupów'},
                                title="📅 Suma wartości zakupów wg dni tygodnia",
                                color_discrete_sequence=["#EF553B"])
             st.plotly_chart(fig_daily)
 
             # Suma wartości zakupów wg miesięcy (Plotly)
-            monthly_revenue = cart_data.groupby('month')['price'].sum().reset_index()
-            fig_monthly = px.bar(monthly_revenue, x='month', y='price',
+            fig_monthly = px.bar(monthly_revenue(cart_data), x='month', y='price',
                                  labels={'month': 'Miesiąc', 'price': 'Suma wartości zakupów'},
                                  title="📆 Suma wartości zakupów wg miesięcy",
                                  color_discrete_sequence=["#00CC96"])
@@ -144,28 +159,49 @@ else:
         # Sekcja Analiza LTV
         st.header("📊 Analiza Lifetime Value (LTV)")
 
-        # Obliczenie LTV na użytkownika
-        ltv_df = calculate_ltv(filtered_df)
+        # Obliczenie LTV na użytkownika (tylko kolumny user_id, event_time i price z wybranego zakresu dat)
+        # W trybie szybkim tylko dla próbki klientów (wg skrótu user_id) - pełny przebieg po klientach jest pomijany
+        ltv_fraction = 1.0
+        if fast_mode and unique_users > LTV_SAMPLE_USERS:
+            ltv_fraction = user_sample_fraction(LTV_SAMPLE_USERS / unique_users)
+        ltv_df = backend.ltv(start_date, end_date, user_fraction=ltv_fraction)
+        ltv_values = ltv_df['LTV'].to_numpy()
 
         # Wyświetlenie podstawowych metryk LTV
         st.subheader("🔍 Podstawowe Metryki LTV")
-        total_ltv = ltv_df['LTV'].sum()
-        average_ltv = ltv_df['LTV'].mean()
-        median_ltv = ltv_df['LTV'].median()
+        if ltv_fraction < 1:
+            st.caption(f"⚡ Metryki, histogram i segmenty LTV dla próbki {ltv_fraction:.1%} klientów "
+                       f"({len(ltv_df):,}) - pobierany plik zawiera wszystkich klientów.")
+        total_ltv, total_ltv_error = sample_total(ltv_values, ltv_fraction)
+        average_ltv, average_ltv_error = sample_mean(ltv_values, ltv_fraction)
+        if fast_mode:
+            (q25_ltv, median_ltv, q75_ltv), ltv_rank_error = sample_quantiles(ltv_values, [0.25, 0.5, 0.75],
+                                                                               fraction=ltv_fraction)
+            median_help = "Wartość dokładna" if not ltv_rank_error else \
+                f"Wartość przybliżona (próbka klientów), błąd rangi ±{ltv_rank_error:.1%} (poziom ufności 95%)"
+        else:
+            q25_ltv, median_ltv, q75_ltv = ltv_df['LTV'].quantile([0.25, 0.5, 0.75])
+            median_help = "Wartość dokładna"
         col4, col5, col6 = st.columns(3)
         with col4:
-            st.metric("💎 Całkowity LTV wszystkich klientów", f"${total_ltv:,.2f}")
+            st.metric("💎 Całkowity LTV wszystkich klientów", f"${total_ltv:,.2f}",
+                      help=error_help("próbka klientów", total_ltv_error))
         with col5: 
-            st.metric("📈 Średni LTV na klienta", f"${average_ltv:,.2f}")
+            st.metric("📈 Średni LTV na klienta", f"${average_ltv:,.2f}",
+                      help=error_help("próbka klientów", average_ltv_error))
         with col6: 
-            st.metric("📊 Mediana LTV", f"${median_ltv:,.2f}")
+            st.metric("📊 Mediana LTV", f"${median_ltv:,.2f}", help=median_help)
 
         # Wizualizacja rozkładu LTV
         st.subheader("📉 Rozkład LTV klientów")
-        fig_ltv = px.histogram(ltv_df, x='LTV', nbins=30,
-                               labels={'LTV': 'Lifetime Value (LTV)'},
-                               title="📈 Histogram LTV klientów",
-                               color_discrete_sequence=["#AB63FA"])
+        # Histogram liczony na serwerze - do przeglądarki trafia 30 słupków zamiast wartości dla każdego klienta
+        ltv_histogram = histogram_counts(ltv_values, nbins=30)
+        fig_ltv = px.bar(ltv_histogram, x='bin_center', y='count',
+                         hover_data={'bin_start': ':.2f', 'bin_end': ':.2f'},
+                         labels={'bin_center': 'Lifetime Value (LTV)', 'count': 'count'},
+                         title="📈 Histogram LTV klientów",
+                         color_discrete_sequence=["#AB63FA"])
+        fig_ltv.update_layout(bargap=0)
         st.plotly_chart(fig_ltv)
 
         # Segmentacja LTV
@@ -174,19 +210,11 @@ else:
         # Definiowanie progu segmentacji
         ltv_thresholds = st.slider("📊 Wybierz progi segmentacji LTV", min_value=float(ltv_df['LTV'].min()),
                                    max_value=float(ltv_df['LTV'].max()),
-                                   value=(ltv_df['LTV'].quantile(0.25), ltv_df['LTV'].quantile(0.75)))
+                                   value=(float(q25_ltv), float(q75_ltv)))
 
         low_threshold, high_threshold = ltv_thresholds
 
-        def segment_ltv(ltv):
-            if ltv >= high_threshold:
-                return '💎 High LTV'
-            elif ltv >= low_threshold:
-                return '💰 Medium LTV'
-            else:
-                return '📉 Low LTV'
-
-        ltv_df['LTV_Segment'] = ltv_df['LTV'].apply(segment_ltv)
+        ltv_df['LTV_Segment'] = ltv_segments(ltv_df['LTV'], low_threshold, high_threshold)
 
         # Wyświetlenie liczby klientów w każdym segmencie
         segment_counts = ltv_df['LTV_Segment'].value_counts().reset_index()
@@ -207,19 +235,18 @@ else:
         # Sekcja Pobierania Danych
         st.header("💾 Pobierz Wyniki Analizy")
 
-        # Przygotowanie danych do pobrania
-        # Kopiowanie DataFrame bez emotikonów w segmentacji
-        ltv_no_emoji = ltv_df.copy()
-        ltv_no_emoji['LTV_Segment'] = ltv_no_emoji['LTV_Segment'].apply(remove_emoji)
+        # Przygotowanie danych do pobrania (dopiero po kliknięciu) - segmenty bez emotikonów
+        # W trybie szybkim plik zawiera wszystkich klientów - pełne LTV liczymy dopiero po kliknięciu
+        def ltv_without_emoji():
+            export_df = ltv_df
+            if ltv_fraction < 1:
+                export_df = backend.ltv(start_date, end_date)
+                export_df['LTV_Segment'] = ltv_segments(export_df['LTV'], low_threshold, high_threshold)
+            segment_names = {name: remove_emoji(name) for name in export_df['LTV_Segment'].unique()}
+            return export_df.assign(LTV_Segment=export_df['LTV_Segment'].map(segment_names))
 
         # Możliwość pobrania LTV
         st.subheader("💎 Pobierz dane LTV klientów")
-        csv_ltv = ltv_no_emoji.to_csv(index=False, encoding='utf-8-sig')
-        st.download_button(
-            label="💾 Pobierz LTV jako CSV",
-            data=csv_ltv,
-            file_name='ltv_klientow.csv',
-            mime='text/csv',
-        )
+        export_button("💾 Pobierz LTV", ltv_without_emoji, 'ltv_klientow', key='export_ltv')
 
 
@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
 import io
-import time
+
+from app.core.catalog import scan_directory
+from app.core.dataset_cache import dataset_meta, list_cached
+from app.core.dataset_store import (
+    clear_session_dataset, get_session_backend, open_catalog_dataset, open_uploaded_dataset, open_uploaded_out_of_core,
+    open_uploaded_sample, set_session_dataset
+)
+from app.core.memory_estimate import available_memory_mb, estimate_memory, plan_load
 
 # Tytuł aplikacji
 st.title("Marketingowa Analiza Danych")
@@ -12,7 +19,48 @@ st.write("""
     Wgraj plik CSV poniżej, a następnie przejdź do odpowiednich analiz na innych stronach.
 """)
 
-# Funkcja do wgrywania pliku z dynamicznym paskiem postępu i wyróżnionymi komunikatami
+LOAD_MODES = {
+    "full": "📦 Cały plik (kompaktowe typy danych)",
+    "sample": "🧪 Próbka warstwowa klientów (wszystkie zdarzenia części klientów z każdej grupy aktywności i wydatków)",
+    "out_of_core": "💾 Cały plik poza pamięcią (DuckDB na Parquet, wolniejsze analizy)",
+}
+
+# Funkcja do wyboru sposobu wczytania na podstawie oszacowanej zajętości pamięci
+# Zwraca (tryb, udział klientów) albo (None, None), dopóki użytkownik nie potwierdzi wyboru
+def choose_load_mode(uploaded_file):
+    # Oszacowanie z próbki początku pliku liczymy raz dla wgranego pliku (wybór opcji odświeża stronę)
+    cached = st.session_state.get('upload_estimate')
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = (uploaded_file.file_id, estimate_memory(uploaded_file))
+        st.session_state['upload_estimate'] = cached
+    estimate = cached[1]
+    plan = plan_load(estimate, available_memory_mb())
+    if plan['fits']:
+        return "full", 1.0
+
+    st.warning(
+        f"⚠️ Plik ({estimate['file_mb']:,.0f} MB, ok. {estimate['rows']:,} wierszy) zajmie po wczytaniu ok. "
+        f"{estimate['compact_mb']:,.0f} MB, a samo wczytywanie nawet {estimate['peak_mb']:,.0f} MB pamięci. "
+        f"Dostępne jest ok. {plan['limit_mb']:,.0f} MB - wybierz sposób wczytania."
+    )
+    # Porównanie ze zwykłym pd.read_csv wg proporcji z zestawienia zbiorów (data/raw/datasets_summary.csv)
+    st.caption(f"Dla porównania: zwykłe wczytanie (typy object i int64) zajęłoby ok. {estimate['naive_mb']:,.0f} MB.")
+    options = [mode for mode in LOAD_MODES if mode != "full"]
+    mode = st.radio("Sposób wczytania", options, index=options.index(plan['recommended']),
+                    format_func=LOAD_MODES.get, key='upload_mode')
+    fraction = 1.0
+    if mode == "sample":
+        percent = st.slider("Udział klientów w próbce [%]", 1, 100, max(int(plan['sample_fraction'] * 100), 1),
+                            key='upload_sample_percent')
+        fraction = percent / 100
+        # Z limitem porównujemy szczyt pamięci przy wczytywaniu, nie rozmiar gotowego zbioru
+        st.caption(f"Szacowane zużycie pamięci przy wczytywaniu próbki: do {estimate['peak_mb'] * fraction:,.0f} MB "
+                   f"(limit {plan['limit_mb']:,.0f} MB).")
+    if not st.button("📥 Wczytaj", key='upload_confirm'):
+        return None, None
+    return mode, fraction
+
+# Funkcja do wgrywania pliku z paskiem postępu opartym na liczbie wczytanych bajtów
 def upload_file():
     uploaded_file = st.file_uploader("Wgraj plik CSV", type="csv")
     
@@ -24,35 +72,52 @@ def upload_file():
         # Etap 1: Plik został wybrany przez użytkownika
         status_box.info("📂 Plik został wybrany. Trwa weryfikacja...")
         progress = progress_bar.progress(0)  # Pasek postępu na 0%
-        time.sleep(1)  # Symulacja krótkiego czasu na reakcję
 
-        # Etap 2: Sprawdzenie rozmiaru pliku
-        file_size_mb = uploaded_file.size / (1024 * 1024)
-        progress.progress(10)  # Pasek postępu na 10%
-        if file_size_mb > 1000:
-            progress_bar.empty()  # Usunięcie paska postępu
-            status_box.error(f"❌ Plik jest zbyt duży: {file_size_mb:.2f} MB. Maksymalny dozwolony rozmiar to 1000 MB.")
+        # Etap 2: Oszacowanie pamięci - za duży plik można wczytać jako próbkę klientów lub poza pamięcią
+        try:
+            mode, fraction = choose_load_mode(uploaded_file)
+        except Exception as e:
+            progress_bar.empty()
+            status_box.error(f"❌ Nie udało się odczytać pliku: {e}")
+            return
+        if mode is None:
+            progress_bar.empty()
+            status_box.empty()
             return
 
-        # Etap 3: Wgrywanie i przetwarzanie pliku
+        # Etap 3: Strumieniowe wgrywanie i przetwarzanie pliku
         status_box.warning("⚙️ Przetwarzanie pliku, proszę czekać...")
-        time.sleep(1)  # Symulacja opóźnienia (opcjonalne)
+
+        def update_progress(bytes_read, total_bytes):
+            percent = int(100 * bytes_read / total_bytes) if total_bytes else 100
+            progress.progress(percent, text=f"Wczytano {bytes_read / (1024 * 1024):,.0f} z {total_bytes / (1024 * 1024):,.0f} MB")
+
         try:
-            df = pd.read_csv(uploaded_file)
-            progress.progress(66)  # Pasek postępu na 66%
-            
-            # Zapisanie danych w stanie sesji
-            st.session_state['df_sales'] = df
+            # Ten sam plik wgrany ponownie jest odczytywany z pamięci serwera lub z kopii Parquet,
+            # a sesja przechowuje tylko klucz zbioru we wspólnym rejestrze
+            if mode == "out_of_core":
+                key = open_uploaded_out_of_core(uploaded_file, uploaded_file.name, progress_callback=update_progress)
+                progress_bar.empty()
+                status_box.empty()
+                st.success(f"🎉 Sukces! Plik został zapisany do analiz poza pamięcią ({dataset_meta(key)['rows']:,} wierszy).")
+                st.dataframe(get_session_backend().head())
+                st.balloons()
+                return
+
+            if mode == "sample":
+                df, from_cache = open_uploaded_sample(uploaded_file, uploaded_file.name, fraction,
+                                                      progress_callback=update_progress)
+            else:
+                df, from_cache = open_uploaded_dataset(uploaded_file, uploaded_file.name, progress_callback=update_progress)
+            if from_cache:
+                progress.progress(100)
 
             # Etap 4: Sukces
-            status_box.success("✅ Plik został pomyślnie przetworzony!")
-            progress.progress(100)  # Pasek postępu na 100%
-            time.sleep(1)  # Daj czas na wyświetlenie 100%
-            
-            # Wyświetlenie danych i komunikat końcowy
             progress_bar.empty()  # Usunięcie paska postępu
             status_box.empty()  # Usunięcie ostatniego komunikatu, jeśli niepotrzebny
-            st.success("🎉 Sukces! Plik został wgrany i przetworzony.")
+            memory_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+            sample_note = f", próbka warstwowa {fraction:.0%} klientów" if mode == "sample" else ""
+            st.success(f"🎉 Sukces! Plik został wgrany i przetworzony ({len(df):,} wierszy{sample_note}, {memory_mb:,.0f} MB w pamięci).")
             st.dataframe(df.head())
             st.balloons()
 
@@ -60,14 +125,59 @@ def upload_file():
             progress_bar.empty()  # Usunięcie paska postępu
             status_box.error(f"❌ Nie udało się wczytać pliku: {e}")
 
+# Funkcja do wyboru zbioru wczytanego wcześniej (z cache Parquet)
+def select_cached_dataset():
+    cached_datasets = list_cached()
+    if not cached_datasets:
+        return
+
+    st.subheader("📁 Lub wybierz wcześniej wczytany zbiór danych")
+    options = {f"{meta['name']} ({meta['rows']:,} wierszy, {meta['created']})": meta['key'] for meta in cached_datasets}
+    selected = st.selectbox("Zbiór danych", list(options.keys()))
+    if st.button("📂 Otwórz wybrany zbiór"):
+        set_session_dataset(options[selected])
+        st.rerun()
+
+# Funkcja do wyboru kilku miesięcy z lokalnego katalogu plików (np. kwartał danych Multistore)
+def select_catalog_months():
+    collections = scan_directory()
+    if not collections:
+        return
+
+    st.subheader("🗓️ Lub połącz kilka miesięcy z katalogu danych")
+    collection = st.selectbox("Kolekcja", list(collections.keys()))
+    entries = collections[collection]
+    labels = {
+        f"{entry['month']} ({entry['size_mb']:,.0f} MB{', gotowy' if entry['registered'] else ''})": entry['month']
+        for entry in entries
+    }
+    selected = st.multiselect("Miesiące", list(labels.keys()))
+    if selected and st.button("🗓️ Otwórz wybrane miesiące"):
+        # Miesiące są konwertowane do Parquet tylko przy pierwszym użyciu, potem czytane bezpośrednio
+        progress = st.progress(0, text="Przygotowanie miesięcy...")
+
+        def update_progress(done, total):
+            progress.progress(min(done / total, 1.0), text=f"Przygotowano {done:.1f} z {total} miesięcy")
+
+        try:
+            open_catalog_dataset(collection, [labels[label] for label in selected], progress_callback=update_progress)
+        except Exception as e:
+            progress.empty()
+            st.error(f"❌ Nie udało się wczytać miesięcy: {e}")
+        else:
+            st.rerun()
+
 # Sprawdzenie, czy plik jest już wgrany
-if 'df_sales' not in st.session_state:
+backend = get_session_backend()
+if backend is None:
     upload_file()
+    select_cached_dataset()
+    select_catalog_months()
 else:
     st.success("Plik CSV został już wgrany.")
-    st.dataframe(st.session_state['df_sales'].head())
+    st.dataframe(backend.head())
     if st.button("Wgraj inny plik"):
-        del st.session_state['df_sales']
+        clear_session_dataset()
         upload_file()
 
 st.divider()
@@ -1,26 +1,28 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
+from app.core.dataset_store import get_dataset_artifact, get_session_backend
+from app.core.exports import export_button
+from app.core.profiling import cached_stage
+from app.core.result_cache import get_result_cache
+from app.core.rfm import QUANTILE_LEVELS, compute_rfm_from_rollup, slice_rollup
+
+# Liczba zapamiętanych wyników RFM (wspólna dla wszystkich sesji)
+RFM_CACHE_SIZE = 16
+
 st.title("📊 Aplikacja do analizy RFM")
 
-# Sprawdzenie, czy plik został wgrany
-if 'df_sales' not in st.session_state:
+# Sprawdzenie, czy plik został wgrany (RFM korzysta tylko z dziennego agregatu - zdarzenia nie są wczytywane)
+if get_session_backend() is None:
     st.warning("🚫 **Proszę wgrać plik CSV na stronie głównej lub innej podstronie.**")
     st.stop()
 
-df_sales = st.session_state['df_sales']
-
-try:
-    # Konwersja kolumny 'event_time' na datetime
-    df_sales['event_time'] = pd.to_datetime(df_sales['event_time'])
-except Exception as e:
-    st.error(f"❌ Nie udało się przetworzyć kolumny 'event_time': {e}")
-    st.stop()
+# Dzienny agregat (user_id, dzień) budowany raz przy wczytywaniu zbioru, posortowany po dniu
+user_daily = get_dataset_artifact(st.session_state['dataset_key'], 'user_daily')
 
 # Wybór zakresu dat
-min_date = df_sales['event_time'].min().date()
-max_date = df_sales['event_time'].max().date()
+min_date = user_daily['day'].iloc[0].date()
+max_date = user_daily['day'].iloc[-1].date()
 
 st.sidebar.header("📅 Wybór Zakresu Dat")
 start_date, end_date = st.sidebar.date_input(
@@ -34,107 +36,22 @@ if start_date > end_date:
     st.error("❗ **Data początkowa nie może być późniejsza niż data końcowa.**")
     st.stop()
 
-# Filtrowanie danych po zakresie dat
-filtered_df = df_sales.loc[
-    (df_sales['event_time'].dt.date >= start_date) &
-    (df_sales['event_time'].dt.date <= end_date)
-    ]
+# Filtrowanie dziennego agregatu po zakresie dat zamiast surowych zdarzeń
+filtered_rollup = slice_rollup(user_daily, start_date, end_date)
 
-if filtered_df.empty:
+if filtered_rollup.empty:
     st.warning("⚠️ **Brak danych dla wybranego zakresu dat.**")
     st.stop()
 
-
-def compute_rfm(df_original: pd.DataFrame) -> pd.DataFrame:
-    df_rfm = df_original.copy()
-
-    # Recency
-    df_rfm['Recency'] = (df_rfm["event_time"].max() - df_rfm["event_time"]).dt.days
-    df_R = df_rfm.groupby('user_id')['Recency'].min().reset_index()
-    df_F = df_rfm.groupby('user_id')['event_type'].count().reset_index().rename(columns={"event_type": "Frequency"})
-    df_M = df_rfm.groupby('user_id')['price'].sum().reset_index().rename(columns={"price": "Monetary"})
-
-    df_RF = pd.merge(df_R, df_F, on='user_id')
-    df_RFM = pd.merge(df_RF, df_M, on='user_id')
-
-    quantiles_R = df_RFM['Recency'].quantile([0.25, 0.50, 0.75]).to_dict()
-    quantiles_F = df_RFM['Frequency'].quantile([0.25, 0.50, 0.75]).to_dict()
-    quantiles_M = df_RFM['Monetary'].quantile([0.25, 0.50, 0.75]).to_dict()
-
-    # Scoring Recency
-    def recency_scoring(rfm):
-        if rfm.Recency <= quantiles_R[0.25]:
-            return 4
-        elif rfm.Recency <= quantiles_R[0.50]:
-            return 3
-        elif rfm.Recency <= quantiles_R[0.75]:
-            return 2
-        else:
-            return 1
-
-    # Scoring Frequency
-    def frequency_scoring(rfm):
-        if rfm.Frequency >= quantiles_F[0.75]:
-            return 4
-        elif rfm.Frequency >= quantiles_F[0.50]:
-            return 3
-        elif rfm.Frequency >= quantiles_F[0.25]:
-            return 2
-        else:
-            return 1
-
-    # Scoring Monetary
-    def monetary_scoring(rfm):
-        if rfm.Monetary >= quantiles_M[0.75]:
-            return 4
-        elif rfm.Monetary >= quantiles_M[0.50]:
-            return 3
-        elif rfm.Monetary >= quantiles_M[0.25]:
-            return 2
-        else:
-            return 1
-
-    df_RFM['Recency_Score'] = df_RFM.apply(recency_scoring, axis=1)
-    df_RFM['Frequency_Score'] = df_RFM.apply(frequency_scoring, axis=1)
-    df_RFM['Monetary_Score'] = df_RFM.apply(monetary_scoring, axis=1)
-
-    df_RFM['Customer_RFM_Score'] = (
-            df_RFM['Recency_Score'].astype(str)
-            + df_RFM['Frequency_Score'].astype(str)
-            + df_RFM['Monetary_Score'].astype(str)
-    )
-
-    def categorizer(rfm):
-        if (rfm[0] in ['2', '3', '4']) and (rfm[1] == '4') and (rfm[2] == '4'):
-            return 'Champion'
-        elif (rfm[0] == '3') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['3', '4']):
-            return 'Top Loyal Customer'
-        elif (rfm[0] == '3') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['1', '2']):
-            return 'Loyal Customer'
-        elif (rfm[0] == '4') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['3', '4']):
-            return 'Top Recent Customer'
-        elif (rfm[0] == '4') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['1', '2']):
-            return 'Recent Customer'
-        elif (rfm[0] in ['2', '3']) and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['3', '4']):
-            return 'Top Customer Needed Attention'
-        elif (rfm[0] in ['2', '3']) and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['1', '2']):
-            return 'Customer Needed Attention'
-        elif (rfm[0] == '1') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['3', '4']):
-            return 'Top Lost Customer'
-        elif (rfm[0] == '1') and (rfm[1] in ['1', '2', '3', '4']) and (rfm[2] in ['1', '2']):
-            return 'Lost Customer'
-        else:
-            return 'Other'
-
-    df_RFM['Customer_Category'] = df_RFM['Customer_RFM_Score'].apply(categorizer)
-
-    return df_RFM
-
-
 if st.button("🔍 Przeprowadź analizę RFM"):
-    # Obliczamy RFM na przefiltrowanych danych (filtered_df)
-    rfm_results = compute_rfm(filtered_df)
+    # Obliczamy RFM na przefiltrowanym agregacie - wynik dla tego samego zbioru
+    # i zakresu dat jest pobierany z cache, także jeśli policzyła go inna sesja
+    rfm_cache = get_result_cache('rfm', RFM_CACHE_SIZE)
+    cache_key = (st.session_state['dataset_key'], start_date, end_date, QUANTILE_LEVELS)
+    rfm_results = cached_stage('rfm', rfm_cache, cache_key,
+                               lambda: compute_rfm_from_rollup(filtered_rollup, QUANTILE_LEVELS), len(filtered_rollup))
     st.session_state["df_rfm_results"] = rfm_results
+    st.session_state["rfm_result_key"] = cache_key
     st.success("Analiza RFM została przeprowadzona pomyślnie!")
 
 if "df_rfm_results" in st.session_state:
@@ -218,12 +135,5 @@ if "df_rfm_results" in st.session_state:
     # Zapisywanie do session_state dla KMeans
     st.session_state["df_kmeans"] = df_kmeans
 
-    # Generujemy dane CSV z nagłówkami w małych literach
-    csv_data = df_kmeans.to_csv(index=False, header=True, encoding='utf-8-sig').encode('utf-8-sig')
-
-    st.download_button(
-        label="💾 Pobierz wyniki RFM jako CSV",
-        data=csv_data,
-        file_name='wyniki_rfm.csv',
-        mime='text/csv',
-    )
+    # Plik z nagłówkami w małych literach generowany dopiero po kliknięciu
+    export_button("💾 Pobierz wyniki RFM", df_kmeans, 'wyniki_rfm', key='export_rfm')
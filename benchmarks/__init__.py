@@ -0,0 +1 @@
+# Powtarzalne benchmarki silnika (app/core) na syntetycznych danych - uruchamianie: python -m benchmarks.suite
@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+# Względny wzrost najlepszego czasu etapu, od którego zgłaszamy regresję (szum pomiaru bywa rzędu kilku %)
+REGRESSION_THRESHOLD = 0.10
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+# Funkcja porównująca dwa wyniki benchmarku etap po etapie (stosunek najlepszych czasów: nowy / bazowy)
+def compare_reports(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    rows = []
+    for stage, result in current['stages'].items():
+        base = baseline['stages'].get(stage)
+        if base is None or 'best_s' not in base or 'best_s' not in result:
+            continue
+        ratio = result['best_s'] / base['best_s'] if base['best_s'] else float('inf')
+        rows.append({
+            'stage': stage,
+            'baseline_s': base['best_s'],
+            'current_s': result['best_s'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Porównanie dwóch wyników benchmarku (JSON).")
+    parser.add_argument('baseline', help="Wynik bazowy (np. z poprzedniego commita)")
+    parser.add_argument('current', help="Wynik bieżący")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="Próg regresji (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    if baseline['parameters'] != current['parameters']:
+        print(f"Uwaga: różne parametry benchmarku: {baseline['parameters']} / {current['parameters']}")
+    print(f"{'etap':<22} {'bazowy':>9} {'bieżący':>9} {'zmiana':>8}")
+    rows = compare_reports(baseline, current, args.threshold)
+    for row in rows:
+        flag = "  REGRESJA" if row['regression'] else ""
+        print(f"{row['stage']:<22} {row['baseline_s']:8.3f}s {row['current_s']:8.3f}s {row['ratio'] - 1:+7.1%}{flag}")
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+from app.core.basket import create_basket_matrix
+from app.core.cube import (
+    build_daily_users_hll, build_revenue_cube, cube_metrics, hourly_revenue, monthly_revenue, weekday_revenue
+)
+from app.core.ingest import read_events_csv
+from app.core.itemsets import mine_frequent_itemsets
+from app.core.ltv import calculate_ltv
+from app.core.profiling import profile_stage, row_count
+from app.core.rfm import build_user_daily_rollup, compute_rfm_from_rollup
+from app.core.scoring import DEFAULT_MODEL_PATH, load_kmeans_model, score_rfm
+from benchmarks.synthetic import DATA_DIR, PROFILES, ensure_events_csv
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+DEFAULT_ROWS = 1_000_000
+DEFAULT_REPEAT = 3
+
+# Parametry analizy koszykowej (jak domyślne na stronie: koszyk = klient, produkty, fpgrowth)
+BASKET_MIN_SUPPORT = 0.001
+BASKET_MAX_LEN = 3
+BASKET_MIN_CONFIDENCE = 0.1
+
+
+def _dashboard_artifacts(df: pd.DataFrame):
+    return build_revenue_cube(df), build_daily_users_hll(df)
+
+
+def _dashboard_metrics(artifacts) -> pd.DataFrame:
+    cube, daily_users = artifacts
+    cube_metrics(cube, daily_users)
+    purchase_cube = cube[cube['event_type'] == 'purchase']
+    hourly_revenue(purchase_cube)
+    weekday_revenue(purchase_cube)
+    return monthly_revenue(purchase_cube)
+
+
+def _basket_rules(df: pd.DataFrame) -> pd.DataFrame:
+    from mlxtend.frequent_patterns import association_rules
+
+    purchases = df.loc[df['event_type'] == 'purchase', ['user_id', 'product_id']]
+    matrix, item_labels = create_basket_matrix(purchases, 'product_id', 'user')
+    itemsets = mine_frequent_itemsets(matrix, item_labels, BASKET_MIN_SUPPORT, max_len=BASKET_MAX_LEN)
+    if itemsets.empty:
+        return itemsets
+    return association_rules(itemsets, metric="confidence", min_threshold=BASKET_MIN_CONFIDENCE)
+
+
+# Model wczytywany raz - pierwsze powtórzenie obejmuje odczyt pliku, kolejne tylko przypisanie do klastrów
+@lru_cache(maxsize=1)
+def _kmeans_model(model_path: str = DEFAULT_MODEL_PATH):
+    return load_kmeans_model(model_path)
+
+
+def _kmeans_scoring(rfm: pd.DataFrame):
+    return score_rfm(_kmeans_model(), rfm)
+
+
+# Etapy benchmarku: nazwa -> (funkcja, nazwa wejścia). Wynik etapu jest wejściem kolejnych
+# (np. dzienny agregat dla RFM), więc etapy liczone są w tej kolejności
+STAGES = {
+    'ingest': (read_events_csv, 'csv'),
+    'rfm_rollup': (build_user_daily_rollup, 'ingest'),
+    'rfm': (compute_rfm_from_rollup, 'rfm_rollup'),
+    'ltv': (calculate_ltv, 'ingest'),
+    'dashboard_artifacts': (_dashboard_artifacts, 'ingest'),
+    'dashboard_metrics': (_dashboard_metrics, 'dashboard_artifacts'),
+    'basket': (_basket_rules, 'ingest'),
+    'kmeans_scoring': (_kmeans_scoring, 'rfm'),
+}
+
+
+# Funkcja do pomiaru etapu: kilka powtórzeń, najlepszy czas i mediana, szczyt pamięci (RSS)
+def measure(name: str, func, data, repeat: int) -> tuple:
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with profile_stage(f"benchmark.{name}", row_count(data)) as record:
+            result = func(data)
+            record['rows_out'] = row_count(result)
+        runs.append(record)
+
+    walls = [run['wall_s'] for run in runs]
+    summary = {
+        'best_s': min(walls),
+        'median_s': statistics.median(walls),
+        'runs_s': walls,
+        'rows_in': runs[-1]['rows_in'],
+        'rows_out': runs[-1]['rows_out'],
+    }
+    if 'peak_rss_delta_mb' in runs[-1]:
+        summary['peak_rss_delta_mb'] = max(run['peak_rss_delta_mb'] for run in runs)
+    return summary, result
+
+
+# Funkcja uruchamiająca wybrane etapy na pliku CSV (etapy potrzebne jako wejście są liczone zawsze)
+def run_suite(csv_path: str, stages=None, repeat: int = DEFAULT_REPEAT) -> dict:
+    selected = list(STAGES) if stages is None else list(stages)
+    needed = set(selected)
+    for name in reversed(list(STAGES)):
+        if name in needed and STAGES[name][1] in STAGES:
+            needed.add(STAGES[name][1])
+
+    outputs = {'csv': csv_path}
+    results = {}
+    for name, (func, input_name) in STAGES.items():
+        if name not in needed:
+            continue
+        if name == 'kmeans_scoring' and not os.path.exists(DEFAULT_MODEL_PATH):
+            results[name] = {'skipped': f"brak modelu {DEFAULT_MODEL_PATH}"}
+            continue
+        summary, outputs[name] = measure(name, func, outputs[input_name], repeat if name in selected else 1)
+        if name in selected:
+            results[name] = summary
+        print(f"{name:<22} {summary['best_s']:8.3f} s", file=sys.stderr)
+    return results
+
+
+# Funkcja opisująca wersję kodu i środowisko (do porównań między commitami)
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark silnika aplikacji na syntetycznych danych.")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="Liczba zdarzeń (np. 1000000 - 70000000)")
+    parser.add_argument('--profile', choices=list(PROFILES), default="multistore", help="Profil danych")
+    parser.add_argument('--seed', type=int, default=0, help="Ziarno generatora")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Liczba powtórzeń każdego etapu")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="Wybrane etapy (domyślnie wszystkie)")
+    parser.add_argument('--csv', help="Własny plik CSV zamiast danych syntetycznych")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Katalog na wygenerowane dane")
+    parser.add_argument('--output', help="Plik wyników JSON (domyślnie w benchmarks/results)")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        csv_path = args.csv
+    else:
+        started = time.perf_counter()
+        csv_path = ensure_events_csv(args.rows, args.profile, args.seed, args.data_dir)
+        print(f"Dane: {csv_path} ({time.perf_counter() - started:.1f} s)", file=sys.stderr)
+
+    report = {
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'environment': environment_info(),
+        'parameters': {
+            'rows': args.rows if not args.csv else None,
+            'profile': args.profile if not args.csv else None,
+            'seed': args.seed,
+            'csv': os.path.basename(csv_path),
+            'repeat': args.repeat,
+        },
+        'stages': run_suite(csv_path, args.stages, args.repeat),
+    }
+
+    output = args.output
+    if output is None:
+        commit = report['environment']['commit'] or "unknown"
+        dataset = os.path.splitext(os.path.basename(csv_path))[0]
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{commit}_{dataset}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
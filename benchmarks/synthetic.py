@@ -0,0 +1,195 @@
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from app.core.ingest import EVENT_DTYPES, EVENT_TIME_FORMAT
+
+# Profile danych zbliżone do zbiorów Cosmetic i Multistore (udział typów zdarzeń, braki, liczba produktów)
+PROFILES = {
+    "cosmetic": {
+        "event_types": {"view": 0.48, "cart": 0.27, "remove_from_cart": 0.18, "purchase": 0.07},
+        "rows_per_user": 10,
+        "products": 54_000,
+        "categories": 525,
+        "brands": 275,
+        "category_code_missing": 0.98,
+        "brand_missing": 0.42,
+        "price_median": 4.0,
+        "product_zipf": 0.8,
+        "user_zipf": 0.6,
+    },
+    "multistore": {
+        "event_types": {"view": 0.94, "cart": 0.04, "purchase": 0.02},
+        "rows_per_user": 14,
+        "products": 200_000,
+        "categories": 700,
+        "brands": 4_000,
+        "category_code_missing": 0.32,
+        "brand_missing": 0.14,
+        "price_median": 160.0,
+        "product_zipf": 0.8,
+        "user_zipf": 0.6,
+    },
+}
+
+# Wykładnik rozkładu Zipfa dla kategorii i marek (dla produktów i użytkowników - w profilu)
+ZIPF_EXPONENT = 1.0
+
+DEFAULT_START = "2019-10-01"
+DEFAULT_DAYS = 31
+GENERATOR_CHUNK_ROWS = 1_000_000
+
+DATA_DIR = os.path.join("benchmarks", "data")
+
+
+@lru_cache(maxsize=8)
+def _zipf_cdf(n_values: int, exponent: float) -> np.ndarray:
+    weights = np.arange(1, n_values + 1, dtype=np.float64) ** -exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+# Losowanie rang z ograniczonego rozkładu Zipfa (0 - najpopularniejsza wartość)
+def zipf_ranks(rng: np.random.Generator, n_values: int, size: int, exponent: float = ZIPF_EXPONENT) -> np.ndarray:
+    ranks = np.searchsorted(_zipf_cdf(n_values, exponent), rng.random(size), side="right")
+    return np.minimum(ranks, n_values - 1)
+
+
+# Funkcja do budowy katalogu produktów: identyfikator, kategoria, kod kategorii, marka i cena każdego produktu
+def build_products(profile: dict, rng: np.random.Generator) -> pd.DataFrame:
+    n_products = profile["products"]
+    n_categories, n_brands = profile["categories"], profile["brands"]
+
+    category_ids = 1487580005000000000 + rng.choice(10**9, n_categories, replace=False)
+    category_codes = np.array([f"category_{i // 20}.sub_{i % 20}" for i in range(n_categories)], dtype=object)
+    category_codes[rng.random(n_categories) < profile["category_code_missing"]] = None
+    brands = np.array([f"brand_{i}" for i in range(n_brands)], dtype=object)
+
+    category = zipf_ranks(rng, n_categories, n_products)
+    brand = brands[zipf_ranks(rng, n_brands, n_products)]
+    brand[rng.random(n_products) < profile["brand_missing"]] = None
+    price = np.round(rng.lognormal(np.log(profile["price_median"]), 0.9, n_products), 2)
+
+    # Identyfikatory losowo permutowane - popularność nie rośnie razem z numerem produktu
+    return pd.DataFrame({
+        "product_id": 1_000_000 + rng.permutation(n_products),
+        "category_id": category_ids[category],
+        "category_code": category_codes[category],
+        "brand": brand,
+        "price": price.astype(np.float32),
+    })
+
+
+# Funkcja do zakodowania par (użytkownik, dzień) jako identyfikatorów sesji w formacie UUID
+def _session_ids(user_ids: np.ndarray, days: np.ndarray, seed: int) -> pd.Categorical:
+    codes, pairs = pd.factorize(user_ids.astype(np.int64) * 100_000 + days)
+    mixed = (np.asarray(pairs).astype(np.uint64) + np.uint64(seed)) * np.uint64(0x9E3779B97F4A7C15)
+    mixed ^= mixed >> np.uint64(31)
+    labels = [
+        f"{value >> 32:08x}-{(value >> 16) & 0xFFFF:04x}-4{value & 0xFFF:03x}-{value >> 48:04x}-{value & 0xFFFFFFFFFFFF:012x}"
+        for value in mixed.tolist()
+    ]
+    return pd.Categorical.from_codes(codes, labels)
+
+
+# Generator syntetycznych zdarzeń w schemacie szablonu CSV (create_template) - kolejne fragmenty są
+# posortowane po czasie, a produkty i użytkownicy mają rozkład Zipfa (jak w rzeczywistych danych)
+def generate_events(rows: int, profile: str = "multistore", seed: int = 0, start: str = DEFAULT_START,
+                    days: int = DEFAULT_DAYS, chunk_rows: int = GENERATOR_CHUNK_ROWS):
+    settings = PROFILES[profile]
+    rng = np.random.default_rng(seed)
+    products = build_products(settings, rng)
+    n_users = max(rows // settings["rows_per_user"], 1)
+    user_ids = 500_000_000 + rng.permutation(n_users)
+    event_types = list(settings["event_types"])
+    event_probabilities = list(settings["event_types"].values())
+
+    # Czas z dokładnością do sekundy (jak w plikach źródłowych)
+    start_s = pd.Timestamp(start).value // 10**9
+    span_s = days * 86_400
+    for offset in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - offset)
+        low = start_s + span_s * offset // rows
+        high = max(start_s + span_s * (offset + size) // rows, low + 1)
+        seconds = np.sort(rng.integers(low, high, size))
+        times = seconds.astype("datetime64[s]").astype("datetime64[ns]")
+
+        users = user_ids[zipf_ranks(rng, n_users, size, settings["user_zipf"])]
+        product = products.iloc[zipf_ranks(rng, len(products), size, settings["product_zipf"])].reset_index(drop=True)
+        day_index = (seconds - start_s) // 86_400
+
+        chunk = pd.DataFrame({
+            "event_time": times,
+            "event_type": pd.Categorical(rng.choice(event_types, size, p=event_probabilities), categories=event_types),
+            "product_id": product["product_id"].to_numpy(),
+            "category_id": product["category_id"].to_numpy(),
+            "category_code": pd.Categorical(product["category_code"]),
+            "brand": pd.Categorical(product["brand"]),
+            "price": product["price"].to_numpy(),
+            "user_id": users,
+            "user_session": _session_ids(users, day_index, seed),
+        })
+        yield chunk[["event_time"] + list(EVENT_DTYPES)]
+
+
+# Funkcja do zamiany fragmentu na tabelę Arrow z tekstowymi kolumnami w formacie pliku źródłowego
+def _csv_table(chunk: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    columns = []
+    for name in table.column_names:
+        column = table[name]
+        if name == "event_time":
+            column = pc.strftime(column.cast(pa.timestamp("s")), format=EVENT_TIME_FORMAT)
+        elif pa.types.is_dictionary(column.type):
+            column = column.cast(pa.string())
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+# Funkcja do zapisu syntetycznego zbioru do CSV fragmentami (bez trzymania całego zbioru w pamięci)
+# Zapis przez pyarrow.csv - kilka razy szybszy od DataFrame.to_csv (wartości nie zawierają przecinków, więc bez cudzysłowów)
+def write_events_csv(path: str, rows: int, profile: str = "multistore", seed: int = 0, **options) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    writer = None
+    try:
+        for chunk in generate_events(rows, profile, seed, **options):
+            table = _csv_table(chunk)
+            if writer is None:
+                writer = pacsv.CSVWriter(tmp_path, table.schema, write_options=pacsv.WriteOptions(quoting_style="none"))
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+# Funkcja zwracająca ścieżkę do syntetycznego zbioru - plik jest generowany tylko raz dla danych parametrów
+def ensure_events_csv(rows: int, profile: str = "multistore", seed: int = 0, data_dir: str = DATA_DIR) -> str:
+    path = os.path.join(data_dir, f"events_{profile}_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        write_events_csv(path, rows, profile, seed)
+    return path
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generator syntetycznych zdarzeń w schemacie szablonu CSV.")
+    parser.add_argument('output', help="Ścieżka pliku CSV")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Liczba zdarzeń")
+    parser.add_argument('--profile', choices=list(PROFILES), default="multistore", help="Profil danych")
+    parser.add_argument('--seed', type=int, default=0, help="Ziarno generatora")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="Liczba dni w zbiorze")
+    args = parser.parse_args(argv)
+    write_events_csv(args.output, args.rows, args.profile, args.seed, days=args.days)
+    print(f"Zapisano {args.rows:,} zdarzeń do {args.output}")
+
+
+if __name__ == '__main__':
+    main()
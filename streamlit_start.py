@@ -1,5 +1,17 @@
+import time
+
+_import_started = time.perf_counter()
+
 import streamlit as st
 
+from app.core.profiling import render_performance_panel
+from app.core.warmup import check_import_budget, start_warmup
+
+# Czas importów przy starcie (zapisywany w logu przy pierwszym uruchomieniu) i rozgrzewanie w tle:
+# ciężkie biblioteki, model KMeans i tabele pochodne ostatniego zbioru są gotowe, zanim sesja ich użyje
+check_import_budget(time.perf_counter() - _import_started)
+start_warmup()
+
 pages = {
     "Home": [
         st.Page("app/pages/home_page.py", title="Home"),
@@ -15,4 +27,10 @@ pages = {
 }
 
 pg = st.navigation(pages)
-pg.run()
\ No newline at end of file
+
+# Panel z pomiarami etapów (czas, pamięć, liczba wierszy, cache) - włączany na pasku bocznym
+# Renderowany przed stroną: strony bez wczytanych danych kończą się st.stop(), a panel ma być widoczny zawsze
+# (pokazuje pomiary do poprzedniego uruchomienia skryptu włącznie)
+render_performance_panel()
+
+pg.run()